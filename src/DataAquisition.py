@@ -6,77 +6,145 @@ API Documentation: https://docs.universalis.app/
 API's used: https://universalis.app/api/v2/marketable, https://xivapi.com/
 
 '''
-import requests
+import http_client
 import json
-import time
+import logging
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 import numpy as np
 from prediction_util import predict_next_price_from_model
-from datetime import datetime
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-import joblib
-
-
-def fetch_and_save_item_data(output_path="items.json"):
-    base_url = "https://xivapi.com/Item"
-    page = 1
-    item_map = {}
-
-    print("Fetching marketable item IDs from Universalis...")
-    marketable_resp = requests.get("https://universalis.app/api/v2/marketable")
+from typing import TYPE_CHECKING
+from model_registry import default_registry
+from response_cache import history_cache
+from batch_regression import fit_series, LinearSeriesModel
+from instrumentation import stage_timer, configure_logging
+from config import TRAINING_ENGINE, INCREMENTAL_TRAINING
+from config import HISTORY_STORE_ENABLED, HISTORY_READ_LIMIT
+from config import CATALOG_MAX_WORKERS, CATALOG_PAGE_SIZE
+from config import SCAN_BATCH_SIZE, SCAN_MAX_WORKERS, BATCH_ENTRIES_PER_ITEM
+from config import UNIVERSALIS_API_URL, XIVAPI_URL
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+def _save_json_atomic(path, data, indent=None):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+    os.replace(tmp_path, path)
+
+
+def fetch_and_save_item_data(output_path="items.json", incremental=True, max_workers=CATALOG_MAX_WORKERS):
+    """Build or refresh the marketable item catalog (name -> ID) at output_path.
+
+    With incremental=True and an existing catalog, only marketable IDs it is
+    missing are looked up (by ID, 100 per request); otherwise every XIVAPI
+    item page is fetched. Requests run on max_workers threads, within the
+    XIVAPI rate limit of the shared HTTP client. Finished pages/chunks are
+    checkpointed to <output_path>.partial.json, so an interrupted run resumes
+    where it stopped, and output_path is only replaced once everything
+    succeeded.
+    """
+    base_url = f"{XIVAPI_URL}/Item"
+    checkpoint_path = f"{output_path}.partial.json"
+
+    logger.info("Fetching marketable item IDs from Universalis...")
+    marketable_resp = http_client.get(f"{UNIVERSALIS_API_URL}/marketable")
     if marketable_resp.status_code != 200:
-        print("Failed to fetch marketable items.")
+        logger.error("Failed to fetch marketable items (HTTP %s).", marketable_resp.status_code)
         return
     marketable_ids = set(marketable_resp.json())
 
-    print("Fetching item data from XIVAPI...")
-
-    while True:
-        response = requests.get(f"{base_url}?page={page}")
+    item_map = {}
+    done_units = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+        item_map = checkpoint.get("items", {})
+        done_units = set(checkpoint.get("done", []))
+        logger.info("Resuming from checkpoint: %d requests already done.", len(done_units))
+
+    existing = {}
+    if incremental and os.path.exists(output_path):
+        with open(output_path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+
+    def fetch_results(query):
+        response = http_client.get(f"{base_url}?{query}")
         if response.status_code != 200:
-            print(f"Failed on page {page}")
-            break
-
-        data = response.json()
-        results = data.get("Results", [])
-
-        for item in results:
-            name = item.get("Name")
-            item_id = item.get("ID")
-            if name and item_id and item_id in marketable_ids:
-                item_map[name] = item_id
-
-        next_page = data.get("Pagination", {}).get("PageNext")
-        if not next_page:
-            break
-
-        page = next_page
-        time.sleep(0.1)  # be polite to the API
-
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(item_map, f, ensure_ascii=False, indent=2)
+            raise RuntimeError(f"XIVAPI returned {response.status_code} for {query}")
+        return response.json()
+
+    if existing:
+        # Drop items that are no longer marketable and look up only new IDs
+        item_map.update({name: item_id for name, item_id in existing.items() if item_id in marketable_ids})
+        known_ids = set(item_map.values())
+        missing_ids = sorted(marketable_ids - known_ids)
+        logger.info("Catalog has %d marketable items; looking up %d new IDs...", len(known_ids), len(missing_ids))
+        units = {
+            f"ids:{chunk[0]}-{chunk[-1]}": f"ids={','.join(map(str, chunk))}&columns=ID,Name"
+            for chunk in (missing_ids[i:i + 100] for i in range(0, len(missing_ids), 100))
+        }
+    else:
+        logger.info("Fetching item data from XIVAPI...")
+        page_query = f"limit={CATALOG_PAGE_SIZE}&columns=ID,Name&page={{}}"
+        first_page = fetch_results(page_query.format(1))
+        page_total = first_page.get("Pagination", {}).get("PageTotal") or 1
+        units = {f"page:{page}": page_query.format(page) for page in range(1, page_total + 1)}
+        units["page:1"] = first_page
+
+    lock = threading.Lock()
+
+    def run_unit(unit, query):
+        data = query if isinstance(query, dict) else fetch_results(query)
+        with lock:
+            for item in data.get("Results", []):
+                name = item.get("Name")
+                item_id = item.get("ID")
+                if name and item_id and item_id in marketable_ids:
+                    item_map[name] = item_id
+            done_units.add(unit)
+            _save_json_atomic(checkpoint_path, {"done": sorted(done_units), "items": item_map})
+
+    pending = {unit: query for unit, query in units.items() if unit not in done_units}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(run_unit, unit, query): unit for unit, query in pending.items()}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed.append(futures[future])
+                logger.error("Failed on %s: %s", futures[future], e)
+
+    if failed:
+        logger.error("%d requests failed; progress saved to '%s'. Run again to resume.", len(failed), checkpoint_path)
+        return
 
-    print(f"Done. Saved {len(item_map)} marketable items to '{output_path}'.")
+    _save_json_atomic(output_path, item_map, indent=2)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
 
-def train_and_save_model(server_name="Leviathan", item_id=5057):
-    print(f"Fetching sales data for item {item_id} on {server_name}...")
-    df = fetch_top_sales_data(server_name, item_id, sales_limit=300)
+    logger.info("Done. Saved %d marketable items to '%s'.", len(item_map), output_path)
 
-    if df.empty:
-        print("No data fetched, aborting training.")
-        return
+def train_model(df: pd.DataFrame) -> "Pipeline":
+    # sklearn takes about a second to import and only this engine needs it
+    from sklearn.linear_model import LinearRegression
+    from sklearn.preprocessing import StandardScaler, OneHotEncoder
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
 
-    print("\n--- Training Timestamp Range ---")
-    print(f"Min: {df['Timestamp'].min()} -> {pd.to_datetime(df['Timestamp'].min(), unit='s')}")
-    print(f"Max: {df['Timestamp'].max()} -> {pd.to_datetime(df['Timestamp'].max(), unit='s')}")
-    print("--------------------------------\n")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Training timestamp range: %s -> %s",
+                     pd.to_datetime(df['Timestamp'].min(), unit='s'), pd.to_datetime(df['Timestamp'].max(), unit='s'))
 
     # Features and target
-    X = df[["ItemID", "Server", "Timestamp"]]
+    X = df[["ItemID", "Server", "Timestamp"]].copy()
     y = df["Price"]
 
     X["Timestamp"] = pd.to_numeric(X["Timestamp"])
@@ -94,51 +162,295 @@ def train_and_save_model(server_name="Leviathan", item_id=5057):
         ('regressor', LinearRegression())
     ])
 
-    print("Training model...")
     model.fit(X, y)
+    return model
 
-    model_path = os.path.join(os.path.dirname(__file__), "regression_model.joblib")
-    joblib.dump(model, model_path)
-    print(f"Model saved to {model_path}")
 
+def train_and_save_model(server_name="Leviathan", item_id=5057, df=None):
+    # Pass df when the history has already been fetched to skip the download.
+    if df is None:
+        logger.info("Fetching sales data for item %s on %s...", item_id, server_name)
+        df = fetch_top_sales_data(server_name, item_id, sales_limit=300)
 
-def fetch_top_sales_data(server_name: str, item_id: int, sales_limit: int = 300) -> pd.DataFrame:
-    history_url = f"https://universalis.app/api/v2/history/{server_name}/{item_id}?entries={sales_limit}"
+    if df.empty:
+        logger.warning("No data fetched for item %s on %s, aborting training.", item_id, server_name)
+        return
+
+    model = train_model(df)
+
+    default_registry.put(server_name, item_id, model)
+    logger.info("Model registered for %s - Item ID: %s", server_name, item_id)
+    return model
+
+
+def train_and_register_models(frames: dict, registry=None) -> dict:
+    """Train one model per world from already-fetched frames ({world: df}).
+
+    With the "batch" engine every new series is fitted in a single NumPy pass
+    and series that already have a registered model are updated from their
+    new sales only; "sklearn" fits the original pipeline per world. Models
+    are registered under (world, item_id) and returned keyed the same way.
+    """
+    if registry is None:
+        registry = default_registry
+
+    frames = {world: df for world, df in frames.items() if df is not None and not df.empty}
+    if not frames:
+        return {}
+
+    with stage_timer("train", world=next(iter(frames)) if len(frames) == 1 else None):
+        models = _train_frames(frames, registry)
+
+    for (world, item_id), model in models.items():
+        registry.put(world, item_id, model)
+    return models
+
+
+def _train_frames(frames, registry):
+    # The sales a lookup trains on: what it reads back from the history store,
+    # or one API window without it. Updated models slide over the same span.
+    window = HISTORY_READ_LIMIT if HISTORY_STORE_ENABLED else 300
+    if TRAINING_ENGINE == "batch":
+        models = {}
+        to_fit = []
+        for world, df in frames.items():
+            key = (world, int(df["ItemID"].iloc[0]))
+            existing = registry.get(*key) if INCREMENTAL_TRAINING else None
+            if isinstance(existing, LinearSeriesModel) and existing.window is not None \
+                    and existing.window.capacity == window:
+                # Only sales newer than the model's last_timestamp are added
+                existing.update_from_frame(df)
+                models[key] = existing
+            else:
+                to_fit.append(df)
+        if to_fit:
+            models.update(fit_series(pd.concat(to_fit, ignore_index=True), window=window))
+    else:
+        models = {}
+        for world, df in frames.items():
+            models[(world, int(df["ItemID"].iloc[0]))] = train_model(df)
+    return models
+
+
+def sales_to_frame(sales, item_id, server_name) -> pd.DataFrame:
+    """Frame of history entries for one world, built column-wise.
+
+    Columns: ItemID (int32), Price (int32), Quantity (int32), Timestamp
+    (int64, epoch seconds) and Server (categorical).
+    """
+    with stage_timer("parse", world=server_name):
+        count = len(sales)
+        timestamps = np.fromiter((sale["timestamp"] for sale in sales), dtype=np.int64, count=count)
+        prices = np.fromiter((sale["pricePerUnit"] for sale in sales), dtype=np.int32, count=count)
+        quantities = np.fromiter((sale.get("quantity", 1) for sale in sales), dtype=np.int32, count=count)
+        return sales_columns_to_frame(timestamps, prices, quantities, item_id, server_name)
+
+
+def sales_columns_to_frame(timestamps, prices, quantities, item_id, server_name) -> pd.DataFrame:
+    count = len(timestamps)
+    if count == 0:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        "ItemID": np.full(count, item_id, dtype=np.int32),
+        "Price": np.asarray(prices, dtype=np.int32),
+        "Quantity": np.asarray(quantities, dtype=np.int32),
+        "Timestamp": np.asarray(timestamps, dtype=np.int64),
+        "Server": pd.Categorical.from_codes(np.zeros(count, dtype=np.int8), categories=[server_name]),
+    })
+
+
+def fetch_history_entries(scope: str, item_id: int, entries: int = 300, entries_within: int = None):
+    """Raw Universalis history entries for a world or data center.
+
+    entries_within limits the response to sales from the last N seconds.
+    Returns the list of entry dicts (newest first), or None if the request
+    failed. Full-window requests go through history_cache, so repeated and
+    concurrent identical requests share one upstream call.
+    """
+    if entries_within is not None:
+        return _request_history_entries(scope, item_id, entries, entries_within)
+    return history_cache.get_or_load(
+        ("history", scope, int(item_id), int(entries)),
+        lambda: _request_history_entries(scope, item_id, entries)
+    )
 
-    print(history_url)
-    print(f"Fetching sales for item {item_id} on {server_name}...")
+
+def _request_history_entries(scope, item_id, entries, entries_within=None):
+    history_url = f"{UNIVERSALIS_API_URL}/history/{scope}/{item_id}?entries={entries}"
+    if entries_within is not None:
+        history_url += f"&entriesWithin={int(entries_within)}"
+
+    logger.debug("Fetching sales for item %s on %s: %s", item_id, scope, history_url)
 
     try:
-        history_resp = requests.get(history_url)
-        if history_resp.status_code != 200:
-            print(f"[Warning] Failed to fetch data for {item_id} from {server_name}")
-            return pd.DataFrame()
-
-        sales = history_resp.json().get("entries", [])[:sales_limit]
-
-        sales_records = []
-        for sale in sales:
-            timestamp = datetime.fromtimestamp(sale['timestamp'])
-            sales_records.append({
-                "ItemID": int(item_id),
-                "Price": sale["pricePerUnit"],
-                "Timestamp": sale["timestamp"],
-                "Day": timestamp.strftime("%Y-%m-%d"),
-                "Time": timestamp.strftime("%H:%M:%S"),
-                "Server": server_name
-            })
-
-        return pd.DataFrame(sales_records)
+        with stage_timer("fetch", scope=scope):
+            history_resp = http_client.get(history_url)
+            if history_resp.status_code != 200:
+                logger.warning("Failed to fetch data for %s from %s (HTTP %s)", item_id, scope, history_resp.status_code)
+                return None
+
+            return history_resp.json().get("entries", [])
 
     except Exception as e:
-        print(f"[Error] Exception fetching data: {e}")
+        logger.error("Exception fetching data for %s from %s: %s", item_id, scope, e)
+        return None
+
+
+def fetch_history_entries_many(scope: str, item_ids, entries: int = 300):
+    """History entries for up to 100 items in one request.
+
+    Returns {item_id: entries} (items Universalis could not resolve are left
+    out), or None if the request failed.
+    """
+    item_ids = [int(item_id) for item_id in item_ids]
+    history_url = f"{UNIVERSALIS_API_URL}/history/{scope}/{','.join(map(str, item_ids))}?entries={entries}"
+    logger.debug("Fetching sales for %d items on %s...", len(item_ids), scope)
+
+    try:
+        with stage_timer("fetch_many", scope=scope):
+            history_resp = http_client.get(history_url)
+            if history_resp.status_code != 200:
+                logger.warning("Failed to fetch data for %d items from %s (HTTP %s)", len(item_ids), scope, history_resp.status_code)
+                return None
+            data = history_resp.json()
+    except Exception as e:
+        logger.error("Exception fetching data for %d items from %s: %s", len(item_ids), scope, e)
+        return None
+
+    # A single ID comes back as the item itself rather than wrapped in "items"
+    if len(item_ids) == 1:
+        return {item_ids[0]: data.get("entries", [])}
+    return {int(item_id): item.get("entries", []) for item_id, item in data.get("items", {}).items()}
+
+
+def split_dc_entries(sales, worlds, sales_limit, requested, allow_empty=False, min_sales=None) -> dict:
+    """Split data-center history entries by worldName.
+
+    Returns {world: entries} (at most sales_limit each) for the worlds the
+    response fully covers. A world is left out if it came back with fewer
+    than min_sales (default sales_limit) entries while the response itself
+    hit the requested entry cap (its older sales may have been crowded out
+    by busier worlds), or if it has no entries and allow_empty is False.
+    """
+    if min_sales is None:
+        min_sales = sales_limit
+    sales_by_world = {world: [] for world in worlds}
+    for sale in sales:
+        world_sales = sales_by_world.get(sale.get("worldName"))
+        if world_sales is not None:
+            world_sales.append(sale)
+
+    truncated = len(sales) >= requested
+    complete = {}
+    for world, world_sales in sales_by_world.items():
+        if truncated and len(world_sales) < min_sales:
+            continue
+        if not world_sales and not allow_empty:
+            continue
+        complete[world] = world_sales[:sales_limit]
+    return complete
+
+
+def fetch_dc_entries_many(dc_name: str, worlds: list, item_ids, sales_limit: int = 300,
+                          batch_size: int = SCAN_BATCH_SIZE, max_workers: int = SCAN_MAX_WORKERS) -> dict:
+    """History entries for many items of one data center, split per world.
+
+    One data-center request per batch_size items, asking for up to
+    sales_limit entries per world but never more than BATCH_ENTRIES_PER_ITEM
+    per item. When that cap cuts a response short, a world counts as covered
+    with its fair share of the cap (BATCH_ENTRIES_PER_ITEM // len(worlds)
+    sales) rather than a full sales_limit, and keeps what the response had
+    for it. Worlds below that, usually the quiet ones, are then fetched per
+    world, batch_size items per request. Returns {(world, item_id): entries, newest first}; worlds
+    without sales map to empty lists, and worlds whose request failed (or
+    every world of a failed batch) are left out.
+    """
+    item_ids = sorted({int(item_id) for item_id in item_ids})
+    requested = min(sales_limit * len(worlds), BATCH_ENTRIES_PER_ITEM)
+    min_sales = min(sales_limit, max(1, requested // len(worlds)))
+    batches = [item_ids[i:i + batch_size] for i in range(0, len(item_ids), batch_size)]
+
+    sales = {}
+    missing = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for entries_by_item in executor.map(lambda batch: fetch_history_entries_many(dc_name, batch, requested), batches):
+            for item_id, item_sales in (entries_by_item or {}).items():
+                covered = split_dc_entries(item_sales, worlds, sales_limit, requested, allow_empty=True,
+                                           min_sales=min_sales)
+                for world in worlds:
+                    if world in covered:
+                        sales[(world, item_id)] = covered[world]
+                    else:
+                        missing.append((world, item_id))
+
+        # Uncovered worlds are fetched per world, again batch_size items at a time
+        missing_by_world = {}
+        for world, item_id in missing:
+            missing_by_world.setdefault(world, []).append(item_id)
+        world_batches = [
+            (world, ids[i:i + batch_size])
+            for world, ids in missing_by_world.items() for i in range(0, len(ids), batch_size)
+        ]
+        if world_batches:
+            logger.debug("%s: fetching %d world histories the batch responses didn't cover in %d requests",
+                         dc_name, len(missing), len(world_batches))
+        fetched = executor.map(lambda batch: fetch_history_entries_many(batch[0], batch[1], sales_limit), world_batches)
+        for (world, _), entries_by_item in zip(world_batches, fetched):
+            for item_id, world_sales in (entries_by_item or {}).items():
+                sales[(world, item_id)] = world_sales[:sales_limit]
+    return sales
+
+
+def fetch_top_sales_data(server_name: str, item_id: int, sales_limit: int = 300) -> pd.DataFrame:
+    sales = fetch_history_entries(server_name, item_id, sales_limit)
+    if sales is None:
         return pd.DataFrame()
+    return sales_to_frame(sales[:sales_limit], item_id, server_name)
+
+
+def fetch_dc_world_entries(dc_name: str, worlds: list, item_id: int, sales_limit: int = 300) -> dict:
+    """{world: entries} for the worlds one data-center request fully covers.
+
+    The split is cached alongside the response, so the world cards of one
+    lookup split it once between them rather than once each.
+    """
+    requested = sales_limit * len(worlds)
+
+    def split():
+        sales = fetch_history_entries(dc_name, item_id, requested)
+        if sales is None:
+            return None
+        covered = split_dc_entries(sales, worlds, sales_limit, requested)
+        missing = [world for world in worlds if world not in covered]
+        if missing:
+            # Normal for quiet worlds; callers fetch them on their own
+            logger.debug("%s response incomplete for: %s", dc_name, ", ".join(missing))
+        return covered
+
+    return history_cache.get_or_load(("dc_split", dc_name, int(item_id), tuple(worlds), int(sales_limit)), split) or {}
+
+
+def fetch_dc_sales_data(dc_name: str, worlds: list, item_id: int, sales_limit: int = 300, only=None) -> dict:
+    """Fetch history for a whole data center in one request, split per world.
+
+    Returns {world: DataFrame} shaped exactly like fetch_top_sales_data output,
+    for the worlds the response fully covers (see split_dc_entries), limited
+    to the worlds in `only` when given. Callers fetch the missing worlds
+    individually.
+    """
+    covered = fetch_dc_world_entries(dc_name, worlds, item_id, sales_limit)
+    return {
+        world: sales_to_frame(world_sales, item_id, world)
+        for world, world_sales in covered.items() if only is None or world in only
+    }
 
 
 # Allows the script to be run directly for testing or imported for function call
 if __name__ == "__main__":
-    train_and_save_model(server_name="Leviathan", item_id=5069)
+    configure_logging()
     df = fetch_top_sales_data(server_name="Leviathan", item_id=5069)
+    train_and_save_model(server_name="Leviathan", item_id=5069, df=df)
     print(predict_next_price_from_model(df))
 
 
@@ -0,0 +1,145 @@
+'''
+api
+
+JSON routes on the Dash app's Flask server, for scripts:
+
+    GET  /api/v1/datacenters
+    GET  /api/v1/lookup?dc=Aether&items=5057,Iron Ingot
+    POST /api/v1/lookup   {"dc": "Aether", "items": [5057, "Iron Ingot"]}
+
+Items are IDs or catalog names (case-insensitive). A lookup returns each
+item's per-world current, min, max and predicted prices. Fresh results come
+from the prediction table. The rest are computed together by
+market_engine.lookup_items: one fetch per batch of items and one fit for all
+of them. They are stored back so the app and later calls reuse them.
+Responses carry an ETag and a Last-Modified date (when the newest result was
+computed). Clients can re-fetch with If-None-Match / If-Modified-Since and
+get a 304 while nothing changed.
+'''
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+from flask import Response, jsonify, request
+
+from market_engine import lookup_items
+from prediction_table import default_prediction_table
+from instrumentation import default_metrics, stage_timer
+from config import DC_WORLDS, API_MAX_ITEMS
+
+logger = logging.getLogger(__name__)
+
+
+def _error(message, status=400):
+    response = jsonify({"error": message})
+    response.status_code = status
+    return response
+
+
+def _requested_items():
+    """(dc, items) from the query string or the JSON body, or None if the
+    body isn't a JSON object."""
+    if request.method == "POST":
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return None
+        return body.get("dc"), body.get("items") or []
+    items = []
+    for value in request.args.getlist("items") + request.args.getlist("item"):
+        items.extend(part.strip() for part in value.split(",") if part.strip())
+    return request.args.get("dc"), items
+
+
+def resolve_items(items, resolve_name):
+    """([(item_id, as requested)], [unknown entries]) for IDs and names.
+
+    IDs are positive ints or strings of ASCII digits; other strings are
+    looked up as names.
+    """
+    resolved, unknown = [], []
+    for item in items:
+        item_id = None
+        if isinstance(item, int) and not isinstance(item, bool):
+            item_id = item
+        elif isinstance(item, str) and item.isascii() and item.isdigit():
+            item_id = int(item)
+        elif isinstance(item, str):
+            item_id = resolve_name(item)
+        if item_id and item_id > 0:
+            resolved.append((item_id, item))
+        else:
+            unknown.append(item)
+    return resolved, unknown
+
+
+def lookup_payload(dc_name, item_ids, table=None):
+    """({item_id: summaries}, newest computed_at) for item_ids, computing
+    only what the prediction table doesn't have fresh."""
+    if table is None:
+        table = default_prediction_table
+    worlds = DC_WORLDS[dc_name]
+
+    cached = table.lookup_many(dc_name, item_ids, worlds)
+    results = {item_id: summaries for item_id, (summaries, _) in cached.items()}
+    computed_at = [computed for _, computed in cached.values()]
+
+    missing = [item_id for item_id in item_ids if item_id not in cached]
+    default_metrics.inc("ffxiv_api_items_total", source="precomputed", amount=len(item_ids) - len(missing))
+    default_metrics.inc("ffxiv_api_items_total", source="live", amount=len(missing))
+    if missing:
+        computed = lookup_items(worlds, missing, dc_name)
+        for item_id, summaries in computed.items():
+            table.upsert(dc_name, item_id, worlds, summaries)
+        results.update(computed)
+        if computed:
+            computed_at.append(time.time())
+
+    return results, max(computed_at) if computed_at else None
+
+
+def register_api(server, resolve_name):
+    """Add the JSON routes to a Flask server. resolve_name maps an item name to its ID."""
+
+    @server.route("/api/v1/datacenters")
+    def api_datacenters():
+        return jsonify({dc_name: list(worlds) for dc_name, worlds in DC_WORLDS.items()})
+
+    @server.route("/api/v1/lookup", methods=["GET", "POST"])
+    def api_lookup():
+        requested = _requested_items()
+        if requested is None:
+            return _error("The request body must be a JSON object")
+        dc_name, items = requested
+        if not isinstance(dc_name, str) or dc_name not in DC_WORLDS:
+            return _error(f"Unknown data center: {dc_name}")
+        if not isinstance(items, list) or not items:
+            return _error("Give at least one item ID or name in 'items'")
+        if len(items) > API_MAX_ITEMS:
+            return _error(f"At most {API_MAX_ITEMS} items per request")
+
+        resolved, unknown = resolve_items(items, resolve_name)
+        item_ids = list(dict.fromkeys(item_id for item_id, _ in resolved))
+
+        with stage_timer("api_lookup"):
+            results, computed_at = lookup_payload(dc_name, item_ids) if item_ids else ({}, None)
+
+        payload = {
+            "dc": dc_name,
+            "items": [
+                {"item_id": item_id, "requested": requested, "found": item_id in results,
+                 "worlds": results.get(item_id, {})}
+                for item_id, requested in resolved
+            ],
+            "unknown": unknown,
+        }
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+        response = Response(body, mimetype="application/json")
+        response.set_etag(hashlib.sha1(body.encode("utf-8")).hexdigest())
+        if computed_at is not None:
+            response.last_modified = datetime.fromtimestamp(computed_at, timezone.utc)
+        # Clients may keep the body but should revalidate before reusing it
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
@@ -0,0 +1,229 @@
+'''
+batch_regression
+
+Vectorized training engine for many price series at once. For a single
+(world, item) series the sklearn pipeline in DataAquisition.train_model reduces
+to an ordinary least squares line of price against timestamp (the one-hot
+Server and ItemID columns are constant within a series, so StandardScaler zeroes
+them). This module fits that line for every series in one NumPy pass using
+grouped sums over stacked arrays, and gives the same predictions.
+'''
+import threading
+
+import numpy as np
+import pandas as pd
+
+from series_store import RingSeries
+
+# Guards in-place update() calls; one registered model can be shared by
+# concurrent lookups of the same item.
+_update_lock = threading.Lock()
+
+
+class LinearSeriesModel:
+    """Price ~ timestamp least squares fit for one (world, item) series.
+
+    Keeps the sufficient statistics of the fit rather than only the
+    coefficients, so update() can fold in new sales without refitting.
+    Timestamps are offset by t_ref (the series' first sale) to keep the sums
+    well conditioned.
+
+    A model fitted with a window (see fit_series) keeps the sales it covers
+    in a RingSeries of that capacity, and update() subtracts the ones pushed
+    out of it, so the fit stays the same as a refit on the newest `window`
+    sales. Without one every sale since the first fit stays in.
+    """
+
+    # Models pickled before windows existed load without one
+    window = None
+
+    def __init__(self, n, t_ref, sum_t, sum_p, sum_tt, sum_tp, slope=None, intercept=None, last_timestamp=None,
+                 window=None):
+        self.n = int(n)
+        self.t_ref = float(t_ref)
+        self.sum_t = float(sum_t)
+        self.sum_p = float(sum_p)
+        self.sum_tt = float(sum_tt)
+        self.sum_tp = float(sum_tp)
+        self.last_timestamp = int(last_timestamp) if last_timestamp is not None else None
+        self.window = window
+        if slope is None or intercept is None:
+            self._solve()
+        else:
+            # Already solved in bulk by fit_series
+            self.slope = float(slope)
+            self.intercept = float(intercept)
+
+    def _solve(self):
+        slope, intercept = solve_coefficients(
+            np.array([self.n]), np.array([self.sum_t]), np.array([self.sum_p]),
+            np.array([self.sum_tt]), np.array([self.sum_tp])
+        )
+        self.slope = float(slope[0])
+        self.intercept = float(intercept[0])
+
+    def _add(self, timestamps, prices, sign=1):
+        dt = np.asarray(timestamps, dtype=np.float64) - self.t_ref
+        prices = np.asarray(prices, dtype=np.float64)
+        self.n += sign * int(dt.size)
+        self.sum_t += sign * float(dt.sum())
+        self.sum_p += sign * float(prices.sum())
+        self.sum_tt += sign * float((dt * dt).sum())
+        self.sum_tp += sign * float((dt * prices).sum())
+
+    def update(self, timestamps, prices):
+        """Fold sales newer than last_timestamp into the fit.
+
+        Rows at or before last_timestamp are assumed already counted and are
+        skipped, so passing a full re-fetched window is safe. With a window,
+        the oldest sales it can no longer hold are taken back out. Cost is
+        proportional to the number of new sales. Returns how many were added.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        with _update_lock:
+            if self.last_timestamp is not None:
+                is_new = timestamps > self.last_timestamp
+                timestamps = timestamps[is_new]
+                prices = prices[is_new]
+            if timestamps.size == 0:
+                return 0
+
+            added = int(timestamps.size)
+            window = self.window
+            if window is not None:
+                # Only the newest `capacity` new sales can stay in the window
+                order = np.argsort(timestamps, kind="stable")[-window.capacity:]
+                timestamps, prices = timestamps[order], prices[order]
+                dropped = max(0, len(window) + timestamps.size - window.capacity)
+                if dropped == len(window):
+                    # Nothing old survives; start the sums over around the new sales
+                    self.n = 0
+                    self.t_ref = float(timestamps[0])
+                    self.sum_t = self.sum_p = self.sum_tt = self.sum_tp = 0.0
+                elif dropped:
+                    oldest = window.view()[:dropped]
+                    self._add(oldest["timestamp"], oldest["price"], sign=-1)
+                window.extend(timestamps, prices)
+
+            self._add(timestamps, prices)
+            self.last_timestamp = int(timestamps.max()) if self.last_timestamp is None \
+                else max(self.last_timestamp, int(timestamps.max()))
+            self._solve()
+            return added
+
+    def update_from_frame(self, df: pd.DataFrame):
+        return self.update(df["Timestamp"].to_numpy(), df["Price"].to_numpy())
+
+    def predict(self, X):
+        # Accepts the same feature frame as the sklearn pipeline, or raw timestamps
+        timestamps = X["Timestamp"] if isinstance(X, pd.DataFrame) else X
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        return self.intercept + self.slope * (timestamps - self.t_ref)
+
+
+def solve_coefficients(n, sum_t, sum_p, sum_tt, sum_tp):
+    """Per-series slope and intercept (at t_ref) from the grouped sums."""
+    n = np.asarray(n, dtype=np.float64)
+    safe_n = np.where(n > 0, n, 1.0)
+    mean_t = sum_t / safe_n
+    mean_p = sum_p / safe_n
+    var_t = sum_tt - sum_t * mean_t
+    cov_tp = sum_tp - sum_t * mean_p
+
+    # A series whose sales all share one timestamp has no slope to fit;
+    # like the sklearn pipeline, predict its mean price.
+    has_spread = var_t > 0
+    slope = np.where(has_spread, cov_tp / np.where(has_spread, var_t, 1.0), 0.0)
+    intercept = mean_p - slope * mean_t
+    return slope, intercept
+
+
+def grouped_sums(group_codes, timestamps, prices, n_groups):
+    """Grouped sufficient statistics for stacked series.
+
+    group_codes assigns each sale to a series 0..n_groups-1. Returns
+    (n, t_ref, sum_t, sum_p, sum_tt, sum_tp) arrays of length n_groups.
+    """
+    group_codes = np.asarray(group_codes, dtype=np.intp)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    prices = np.asarray(prices, dtype=np.float64)
+
+    n = np.bincount(group_codes, minlength=n_groups)
+    t_ref = np.zeros(n_groups, dtype=np.float64)
+    present, first_index = np.unique(group_codes, return_index=True)
+    t_ref[present] = timestamps[first_index]
+
+    dt = timestamps - t_ref[group_codes]
+    sum_t = np.bincount(group_codes, weights=dt, minlength=n_groups)
+    sum_p = np.bincount(group_codes, weights=prices, minlength=n_groups)
+    sum_tt = np.bincount(group_codes, weights=dt * dt, minlength=n_groups)
+    sum_tp = np.bincount(group_codes, weights=dt * prices, minlength=n_groups)
+    return n, t_ref, sum_t, sum_p, sum_tt, sum_tp
+
+
+def factorize_keys(df: pd.DataFrame, key_columns=("Server", "ItemID")):
+    """Integer series code per row plus the key tuple for each code."""
+    combined = np.zeros(len(df), dtype=np.int64)
+    uniques_by_column = []
+    for column in key_columns:
+        codes, uniques = pd.factorize(df[column])
+        combined = combined * len(uniques) + codes
+        uniques_by_column.append(uniques)
+
+    group_codes, combined_uniques = pd.factorize(combined)
+    keys = []
+    for code in combined_uniques.tolist():
+        key = []
+        for uniques in reversed(uniques_by_column):
+            code, index = divmod(code, len(uniques))
+            key.append(uniques[index])
+        keys.append(tuple(reversed(key)))
+    return group_codes, keys
+
+
+def _series_windows(group_codes, timestamps, prices, n_groups, capacity):
+    # One RingSeries per series, holding the sales it was fitted on
+    order = np.argsort(group_codes, kind="stable")
+    bounds = np.cumsum(np.bincount(group_codes, minlength=n_groups))[:-1]
+    windows = []
+    for series_timestamps, series_prices in zip(np.split(timestamps[order], bounds), np.split(prices[order], bounds)):
+        window = RingSeries(capacity)
+        window.extend(series_timestamps, series_prices)
+        windows.append(window)
+    return windows
+
+
+def fit_series(df: pd.DataFrame, key_columns=("Server", "ItemID"), window=None) -> dict:
+    """Fit every series in a stacked sales frame in one pass.
+
+    df holds the rows of many series (e.g. pd.concat of per-world frames) with
+    Price and Timestamp columns. Returns {(server, item_id): LinearSeriesModel}.
+    With window set, each model keeps its sales so later updates slide over
+    the newest `window` of them; every series must then have at most that
+    many rows.
+    """
+    if df.empty:
+        return {}
+
+    group_codes, keys = factorize_keys(df, key_columns)
+    n, t_ref, sum_t, sum_p, sum_tt, sum_tp = grouped_sums(
+        group_codes, df["Timestamp"].to_numpy(), df["Price"].to_numpy(), len(keys)
+    )
+    slope, intercept = solve_coefficients(n, sum_t, sum_p, sum_tt, sum_tp)
+    last_timestamp = np.zeros(len(keys), dtype=np.int64)
+    np.maximum.at(last_timestamp, group_codes, df["Timestamp"].to_numpy(dtype=np.int64))
+
+    if window is not None:
+        windows = _series_windows(group_codes, df["Timestamp"].to_numpy(dtype=np.int64),
+                                  df["Price"].to_numpy(), len(keys), window)
+    else:
+        windows = [None] * len(keys)
+
+    columns = zip(keys, n.tolist(), t_ref.tolist(), sum_t.tolist(), sum_p.tolist(),
+                  sum_tt.tolist(), sum_tp.tolist(), slope.tolist(), intercept.tolist(),
+                  last_timestamp.tolist(), windows)
+    return {
+        (server, int(item_id)): LinearSeriesModel(*stats)
+        for (server, item_id), *stats in columns
+    }
@@ -0,0 +1,222 @@
+'''
+bench_server
+
+Local stand-in for the Universalis and XIVAPI endpoints the tool uses, for
+benchmarks and offline runs. Serves /api/v2/marketable,
+/api/v2/history/<world|dc>/<ids> and XIVAPI-style /Item pages, either from
+recorded JSON files or from deterministic synthetic data, with configurable
+latency.
+
+Point the tool at it with
+    FFXIV_UNIVERSALIS_URL=http://127.0.0.1:8765/api/v2
+    FFXIV_XIVAPI_URL=http://127.0.0.1:8765
+
+Recordings are looked up by request path, e.g. a saved Universalis response
+at <recordings>/api/v2/history/Aether/5069.json is served for
+/api/v2/history/Aether/5069 regardless of the query string.
+'''
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from config import DC_WORLDS
+
+SALE_INTERVAL_SECONDS = 1800
+
+
+def synthetic_item_ids(count, first_id=2000):
+    return list(range(first_id, first_id + count))
+
+
+def synthetic_catalog(item_ids):
+    return [{"ID": item_id, "Name": f"Bench Item {item_id}"} for item_id in item_ids]
+
+
+def world_activity(item_id, world):
+    """Relative sales rate of an item on a world, between 0.1 and 1."""
+    return random.Random(f"{item_id}:{world}").uniform(0.1, 1.0)
+
+
+def synthetic_entries(scope, item_id, entries, entries_within=None, now=None):
+    """Sales for item_id on a world or data center, newest first.
+
+    Prices follow a per-world trend plus noise seeded by (scope, item, world),
+    so the same request always returns the same data. Worlds sell at
+    different rates, so in a capped data-center response the quiet worlds
+    come back short, as on the real API.
+    """
+    now = int(now if now is not None else time.time())
+    worlds = DC_WORLDS.get(scope, [scope])
+    activity = {world: world_activity(item_id, world) for world in worlds}
+    total_activity = sum(activity.values())
+    oldest = now - entries_within if entries_within else None
+
+    sales = []
+    for index, world in enumerate(worlds):
+        rng = random.Random(f"{scope}:{item_id}:{world}")
+        base = 1000 + (item_id % 97) * 50 + index * 25
+        trend = rng.uniform(-0.5, 0.5)
+        # Each world's share of the newest `entries` sales, plus one to spare
+        per_world = entries if len(worlds) == 1 else int(entries * activity[world] / total_activity) + 1
+        interval = int(SALE_INTERVAL_SECONDS / activity[world])
+        for k in range(per_world):
+            timestamp = now - k * interval - rng.randrange(interval)
+            if oldest is not None and timestamp < oldest:
+                break
+            sales.append({
+                "hq": rng.random() < 0.3,
+                "pricePerUnit": max(1, int(base - trend * k + rng.gauss(0, base * 0.05))),
+                "quantity": rng.randint(1, 20),
+                "buyerName": f"Buyer {rng.randrange(500)}",
+                "onMannequin": False,
+                "timestamp": timestamp,
+                "worldName": world,
+                "worldID": 1000 + index,
+            })
+    sales.sort(key=lambda sale: sale["timestamp"], reverse=True)
+    return sales[:entries]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, item_count=2000, latency=0.0, jitter=0.0, recordings=None, page_size=3000):
+        super().__init__(address, StandInHandler)
+        self.item_ids = synthetic_item_ids(item_count)
+        self.latency = latency
+        self.jitter = jitter
+        self.recordings = recordings
+        self.page_size = page_size
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # Serve from a background thread (for in-process benchmarks)
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count_request(self):
+        with self._count_lock:
+            self.request_count += 1
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def recorded(self, path):
+        if not self.recordings:
+            return None
+        file_path = os.path.join(self.recordings, *[part for part in path.split("/") if part]) + ".json"
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def respond(self, path, query):
+        """(status, payload) for a request."""
+        recorded = self.recorded(path)
+        if recorded is not None:
+            return 200, recorded
+
+        parts = [part for part in path.split("/") if part]
+        if parts == ["api", "v2", "marketable"]:
+            return 200, self.item_ids
+        if len(parts) == 5 and parts[:3] == ["api", "v2", "history"]:
+            return self.history(parts[3], parts[4], query)
+        if parts == ["Item"]:
+            return 200, self.items(query)
+        return 404, {"error": "not found"}
+
+    def history(self, scope, ids, query):
+        entries = int(query.get("entries", ["1800"])[0])
+        entries_within = query.get("entriesWithin", [None])[0]
+        entries_within = int(entries_within) if entries_within else None
+        try:
+            item_ids = [int(item_id) for item_id in ids.split(",")]
+        except ValueError:
+            return 400, {"error": "bad item id"}
+
+        def item_payload(item_id):
+            payload = {"itemID": item_id, "entries": synthetic_entries(scope, item_id, entries, entries_within)}
+            if scope in DC_WORLDS:
+                payload["dcName"] = scope
+            else:
+                payload["worldName"] = scope
+            return payload
+
+        if len(item_ids) == 1:
+            return 200, item_payload(item_ids[0])
+        return 200, {"itemIDs": item_ids, "items": {str(item_id): item_payload(item_id) for item_id in item_ids}}
+
+    def items(self, query):
+        if "ids" in query:
+            wanted = {int(item_id) for item_id in query["ids"][0].split(",") if item_id}
+            return {"Results": synthetic_catalog(sorted(wanted & set(self.item_ids)))}
+
+        limit = int(query.get("limit", [self.page_size])[0])
+        page = int(query.get("page", ["1"])[0])
+        page_total = max(1, -(-len(self.item_ids) // limit))
+        chunk = self.item_ids[(page - 1) * limit:page * limit]
+        return {
+            "Pagination": {"Page": page, "PageTotal": page_total, "Results": len(chunk), "ResultsTotal": len(self.item_ids)},
+            "Results": synthetic_catalog(chunk),
+        }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.count_request()
+        self.server.delay()
+        url = urlsplit(self.path)
+        status, payload = self.server.respond(url.path, parse_qs(url.query))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Universalis/XIVAPI stand-in.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--items", type=int, default=2000, help="number of synthetic marketable items")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--recordings", help="directory of recorded JSON responses, served by request path")
+    args = parser.parse_args()
+
+    server = StandInServer((args.host, args.port), args.items, args.latency, args.jitter, args.recordings)
+    print(f"Serving on {server.base_url} (Universalis at {server.base_url}/api/v2)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+'''
+benchmark
+
+Reproducible performance benchmarks. It starts the local Universalis/XIVAPI
+stand-in (bench_server.py) and points the tool at it. Each run uses a fresh
+history store and prediction table in a temporary directory. It then times
+these stages:
+
+    item_lookup.*   loading the compiled catalog, building the item index,
+                    search-as-you-type and name -> ID
+    fetch.*         per-world and data-center history requests (cache cleared)
+    parse.*         decoding a data-center response into per-world frames
+    train.* / predict.*   fitting and predicting one model per world
+    series_store.*  ring-buffer appends and loading a data center's sales
+    e2e.*           the Dash lookup for a whole data center: update_all_outputs,
+                    every world's render_world_card in parallel (as the browser
+                    fires them) and update_summary, through the Flask test
+                    client. "cold" looks up a new item each time; "warm"
+                    repeats one.
+
+Results are written as JSON (--output, default stdout) with the git revision
+and settings, so runs can be compared between versions:
+
+    python benchmark.py --output before.json
+    python benchmark.py --baseline before.json --output after.json
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Project modules read their settings (API URLs, database paths) from the
+# environment at import time, so they are imported in run_benchmarks() after
+# main() has pointed that environment at the stand-in.
+
+
+def summarize(samples, **extra):
+    samples_ms = sorted(sample * 1000 for sample in samples)
+    count = len(samples_ms)
+    stats = {
+        "n": count,
+        "mean_ms": round(sum(samples_ms) / count, 3),
+        "median_ms": round(samples_ms[count // 2], 3),
+        "p95_ms": round(samples_ms[min(count - 1, int(count * 0.95))], 3),
+        "min_ms": round(samples_ms[0], 3),
+        "max_ms": round(samples_ms[-1], 3),
+    }
+    stats.update(extra)
+    return stats
+
+
+def timed(fn, repeat, setup=None):
+    samples = []
+    for i in range(repeat):
+        args = setup(i) if setup else ()
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def dash_request(client, output, outputs, inputs, state=()):
+    # One /_dash-update-component call, shaped like the browser sends it.
+    # An input given as a list of (id, prop, value) is a wildcard (ALL) input.
+    def prop_id(component_id, prop):
+        if isinstance(component_id, dict):
+            component_id = json.dumps(component_id, separators=(",", ":"), sort_keys=True)
+        return f"{component_id}.{prop}"
+
+    def spec(entry):
+        if isinstance(entry, list):
+            return [spec(item) for item in entry]
+        component_id, prop, value = entry
+        return {"id": component_id, "property": prop, "value": value}
+
+    first = inputs[0][0] if isinstance(inputs[0], list) else inputs[0]
+    output_specs = [{"id": component_id, "property": prop} for component_id, prop in outputs]
+    body = {
+        "output": output,
+        "outputs": output_specs if len(output_specs) > 1 else output_specs[0],
+        "inputs": [spec(entry) for entry in inputs],
+        "state": [spec(entry) for entry in state],
+        "changedPropIds": [prop_id(first[0], first[1])],
+    }
+    response = client.post("/_dash-update-component", json=body)
+    if response.status_code not in (200, 204):
+        raise RuntimeError(f"Dash callback {output} returned {response.status_code}")
+    return response.get_json() if response.status_code == 200 else None
+
+
+def run_benchmarks(args, server):
+    import main
+    import http_client
+    from DataAquisition import fetch_history_entries, split_dc_entries, sales_to_frame, train_and_register_models
+    from item_index import ItemIndex, load_catalog
+    from model_registry import ModelRegistry
+    from prediction_util import predict_next_prices
+    from response_cache import history_cache
+    from series_store import RingSeries, SeriesStore
+    from config import DC_WORLDS, UNIVERSALIS_API_URL, LOOKUP_MAX_WORKERS
+    from config import HISTORY_FETCH_MODE, TRAINING_ENGINE, CHART_MODE, SERIES_CAPACITY
+
+    rng = random.Random(args.seed)
+    results = {}
+    dcs = args.dc or list(DC_WORLDS)
+    sales_limit = 300
+
+    app = main.create_app()
+    catalog = main.item_data
+    names = sorted(catalog)
+    if not names:
+        raise SystemExit("items.json is empty or missing; build the catalog first (firstrun.py)")
+
+    # Item lookup
+    catalog_path = os.path.join(os.path.dirname(os.path.abspath(main.__file__)), "items.json")
+    results["item_lookup.load_catalog"] = summarize(timed(lambda: load_catalog(catalog_path), args.repeat), items=len(catalog))
+    results["item_lookup.build_index"] = summarize(timed(lambda: ItemIndex(catalog), args.repeat), items=len(catalog))
+    queries = [name[:rng.randint(2, 6)] for name in rng.sample(names, min(len(names), args.queries))]
+    results["item_lookup.search"] = summarize(timed(lambda i: main.item_index.search(queries[i]), len(queries), lambda i: (i,)))
+    exact = rng.sample(names, min(len(names), args.queries))
+    results["item_lookup.id_for"] = summarize(timed(lambda i: main.get_item_id_from_name(exact[i]), len(exact), lambda i: (i,)))
+
+    item_ids = [catalog[name] for name in rng.sample(names, min(len(names), args.items))]
+    dc = dcs[0]
+    worlds = DC_WORLDS[dc]
+
+    # Fetch: every request goes upstream
+    def fetch_all(scope, entries):
+        history_cache.clear()
+        with ThreadPoolExecutor(max_workers=LOOKUP_MAX_WORKERS) as executor:
+            list(executor.map(lambda item_id: fetch_history_entries(scope, item_id, entries), item_ids))
+
+    for name, scope, entries in (("fetch.world_history", worlds[0], sales_limit),
+                                 ("fetch.dc_history", dc, sales_limit * len(worlds))):
+        samples = timed(lambda: fetch_all(scope, entries), args.repeat)
+        stats = summarize([sample / len(item_ids) for sample in samples])
+        stats["requests_per_second"] = round(len(item_ids) * len(samples) / sum(samples), 2)
+        stats["concurrency"] = LOOKUP_MAX_WORKERS
+        results[name] = stats
+
+    # Parse one data-center response into per-world frames
+    requested = sales_limit * len(worlds)
+    raw = http_client.get(f"{UNIVERSALIS_API_URL}/history/{dc}/{item_ids[0]}?entries={requested}").content
+
+    def parse():
+        sales = json.loads(raw).get("entries", [])
+        return {
+            world: sales_to_frame(world_sales, item_ids[0], world)
+            for world, world_sales in split_dc_entries(sales, worlds, sales_limit, requested).items()
+        }
+
+    results["parse.dc_history"] = summarize(timed(parse, args.repeat), bytes=len(raw), worlds=len(worlds))
+
+    # Train and predict one model per world
+    frames = parse()
+    registries = []
+    results["train.dc"] = summarize(timed(
+        lambda registry: train_and_register_models(frames, registry), args.repeat,
+        lambda i: (registries.append(ModelRegistry()) or registries[-1],)
+    ), engine=TRAINING_ENGINE, worlds=len(frames))
+    results["predict.dc"] = summarize(timed(lambda: predict_next_prices(frames, registries[-1]), args.repeat))
+
+    # In-memory series: single appends, and loading a data center's frames
+    series = RingSeries(SERIES_CAPACITY)
+    results["series_store.append"] = summarize(timed(lambda i: series.append(i + 1, 100, 1), 10000, lambda i: (i,)))
+    store = SeriesStore()
+
+    def load_series(i):
+        for world, df in frames.items():
+            store.extend(world, i, df["Timestamp"].to_numpy(), df["Price"].to_numpy(), df["Quantity"].to_numpy())
+
+    results["series_store.extend_dc"] = summarize(timed(load_series, args.repeat, lambda i: (i,)))
+    results["series_store.extend_dc"]["bytes_per_series"] = round(store.stats()["bytes"] / max(1, len(store)), 1)
+
+    # End to end, per data center
+    lookup_key = next(key for key in app.callback_map if "lookup-message" in key)
+    card_key = next(key for key in app.callback_map if "world-card" in key)
+    summary_key = next(key for key in app.callback_map if "summary-container" in key)
+
+    def lookup(dc_name, item_name, n_clicks):
+        client = app.server.test_client()
+        dash_request(
+            client, lookup_key,
+            [("lookup-message", "children"), ("sales-output", "children")],
+            [("lookup-btn", "n_clicks", n_clicks), ("enter-catcher", "n_submit", None)],
+            [("dc-dropdown", "value", dc_name), ("item-name-dropdown", "value", item_name)]
+        )
+
+        def render(world):
+            request = {"dc": dc_name, "item_id": catalog[item_name], "n": n_clicks, "world": world}
+            response = dash_request(
+                app.server.test_client(), card_key,
+                [({"type": "world-card", "world": world}, "children"), ({"type": "world-result", "world": world}, "data")],
+                [({"type": "world-request", "world": world}, "data", request)]
+            )
+            return response["response"][json.dumps({"type": "world-result", "world": world}, separators=(",", ":"))]["data"]
+
+        with ThreadPoolExecutor(max_workers=len(DC_WORLDS[dc_name])) as executor:
+            world_results = list(executor.map(render, DC_WORLDS[dc_name]))
+
+        dash_request(
+            client, summary_key, [("summary-container", "children")],
+            [[({"type": "world-result", "world": world}, "data", result)
+              for world, result in zip(DC_WORLDS[dc_name], world_results)]]
+        )
+
+    for dc_name in dcs:
+        cold_items = rng.sample(names, min(len(names), args.repeat))
+        results[f"e2e.cold.{dc_name}"] = summarize(
+            timed(lambda i: lookup(dc_name, cold_items[i % len(cold_items)], i + 1), args.repeat, lambda i: (i,)),
+            worlds=len(DC_WORLDS[dc_name])
+        )
+        results[f"e2e.warm.{dc_name}"] = summarize(
+            timed(lambda i: lookup(dc_name, cold_items[0], i + 1), args.repeat, lambda i: (i,)),
+            worlds=len(DC_WORLDS[dc_name])
+        )
+
+    settings = {
+        "repeat": args.repeat,
+        "items": len(item_ids),
+        "latency_s": args.latency,
+        "jitter_s": args.jitter,
+        "seed": args.seed,
+        "recordings": bool(args.recordings),
+        "history_fetch_mode": HISTORY_FETCH_MODE,
+        "training_engine": TRAINING_ENGINE,
+        "chart_mode": CHART_MODE,
+        "upstream_requests": server.request_count,
+    }
+    return settings, results
+
+
+def compare(results, baseline, tolerance):
+    # Stages whose median got slower than the baseline by more than tolerance
+    regressions = {}
+    for name, stats in results.items():
+        before = baseline.get("results", {}).get(name)
+        if before and before.get("median_ms"):
+            ratio = stats["median_ms"] / before["median_ms"]
+            if ratio > 1 + tolerance:
+                regressions[name] = round(ratio, 3)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lookup pipeline against a local Universalis stand-in.")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--dc", action="append", help="data center for the end-to-end runs (repeatable; default all)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per stage")
+    parser.add_argument("--items", type=int, default=50, help="items per fetch throughput run")
+    parser.add_argument("--queries", type=int, default=200, help="item searches to time")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random stand-in latency, up to this many seconds")
+    parser.add_argument("--recordings", help="directory of recorded responses for the stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", help="earlier results file; exit 1 if a stage's median regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed median slowdown against --baseline")
+    args = parser.parse_args()
+
+    base_url = f"http://127.0.0.1:{args.port}"
+    workdir = tempfile.mkdtemp(prefix="ffxiv-bench-")
+    os.environ["FFXIV_UNIVERSALIS_URL"] = f"{base_url}/api/v2"
+    os.environ["FFXIV_XIVAPI_URL"] = base_url
+    os.environ["FFXIV_HISTORY_DB"] = os.path.join(workdir, "history.sqlite3")
+    os.environ["FFXIV_PREDICTION_DB"] = os.path.join(workdir, "predictions.sqlite3")
+    os.environ.setdefault("FFXIV_LOG_LEVEL", "WARNING")
+
+    from bench_server import StandInServer
+    server = StandInServer(("127.0.0.1", args.port), latency=args.latency, jitter=args.jitter,
+                           recordings=args.recordings).start()
+    try:
+        settings, results = run_benchmarks(args, server)
+    finally:
+        server.stop()
+
+    # Where the time went across the whole run, from the pipeline's own timers
+    from instrumentation import default_metrics
+    stages = {}
+    for labels, histogram in default_metrics.snapshot()["histograms"].get("ffxiv_stage_seconds", {}).items():
+        stage = stages.setdefault(dict(labels)["stage"], {"count": 0, "total_ms": 0.0})
+        stage["count"] += histogram["count"]
+        stage["total_ms"] = round(stage["total_ms"] + histogram["sum"] * 1000, 3)
+
+    report = {
+        "version": git_revision(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": settings,
+        "results": results,
+        "stages": stages,
+    }
+
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, stats in results.items():
+        print(f"{name:32} median {stats['median_ms']:10.3f} ms  p95 {stats['p95_ms']:10.3f} ms", file=sys.stderr)
+    for name, ratio in regressions.items():
+        print(f"[Regression] {name}: {ratio:.2f}x baseline median", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+'''
+charts
+
+Figure builders for the world cards. Instead of shipping every raw sale to
+the browser as an SVG scatter, sales can be aggregated on the server into
+time buckets (open/high/low/close, volume and volume-weighted average price,
+computed with NumPy) and drawn with WebGL traces. Figures take a sales
+DataFrame, a series_store.RingSeries (read as views) or SALE_DTYPE records.
+plotly is imported on the first figure rather than at app start.
+'''
+import numpy as np
+import pandas as pd
+
+from config import CHART_MODE, CHART_BUCKET_SECONDS
+from instrumentation import stage_timer
+
+
+def sales_columns(sales):
+    """(timestamps, prices, quantities or None) of a sales DataFrame,
+    RingSeries or SALE_DTYPE record array."""
+    if isinstance(sales, pd.DataFrame):
+        quantities = sales['Quantity'].to_numpy() if 'Quantity' in sales else None
+        return sales['Timestamp'].to_numpy(), sales['Price'].to_numpy(), quantities
+    if isinstance(sales, np.ndarray):
+        return sales['timestamp'], sales['price'], sales['quantity']
+    return sales.timestamps, sales.prices, sales.quantities
+
+
+def aggregate_sales(sales, bucket_seconds=CHART_BUCKET_SECONDS) -> pd.DataFrame:
+    """Bucket sales (see sales_columns) by time.
+
+    Returns one row per non-empty bucket, oldest first: BucketStart
+    (datetime), Open, High, Low, Close, Volume, VWAP and Sales.
+    """
+    timestamps, prices, quantities = sales_columns(sales)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    order = np.argsort(timestamps, kind="stable")
+    timestamps = timestamps[order]
+    prices = np.asarray(prices, dtype=np.float64)[order]
+    if quantities is not None:
+        quantities = np.asarray(quantities, dtype=np.float64)[order]
+    else:
+        quantities = np.ones_like(prices)
+
+    buckets = timestamps // bucket_seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]]) if len(buckets) else np.array([], dtype=np.intp)
+    if len(starts) == 0:
+        return pd.DataFrame(columns=["BucketStart", "Open", "High", "Low", "Close", "Volume", "VWAP", "Sales"])
+    ends = np.r_[starts[1:], len(buckets)]
+
+    volume = np.add.reduceat(quantities, starts)
+    return pd.DataFrame({
+        "BucketStart": pd.to_datetime(buckets[starts] * bucket_seconds, unit='s'),
+        "Open": prices[starts],
+        "High": np.maximum.reduceat(prices, starts),
+        "Low": np.minimum.reduceat(prices, starts),
+        "Close": prices[ends - 1],
+        "Volume": volume,
+        "VWAP": np.add.reduceat(prices * quantities, starts) / volume,
+        "Sales": ends - starts,
+    })
+
+
+def world_trace(sales, world, mode=CHART_MODE, bucket_seconds=CHART_BUCKET_SECONDS):
+    import plotly.graph_objs as go
+
+    if mode in ("raw", "webgl"):
+        timestamps, prices, _ = sales_columns(sales)
+        scatter = go.Scatter if mode == "raw" else go.Scattergl
+        return scatter(
+            x=pd.to_datetime(np.asarray(timestamps, dtype=np.int64), unit='s'),
+            y=prices,
+            mode='lines+markers',
+            name=world
+        )
+
+    buckets = aggregate_sales(sales, bucket_seconds)
+    vwap = buckets["VWAP"].to_numpy()
+    return go.Scattergl(
+        x=buckets["BucketStart"],
+        y=vwap.round(2),
+        mode='lines+markers',
+        name=world,
+        # Whiskers show each bucket's lowest and highest sale
+        error_y=dict(
+            type='data',
+            symmetric=False,
+            array=(buckets["High"].to_numpy() - vwap).round(2),
+            arrayminus=(vwap - buckets["Low"].to_numpy()).round(2),
+            thickness=1,
+            width=0
+        ),
+        customdata=np.stack([buckets["Volume"].to_numpy(), buckets["Sales"].to_numpy()], axis=-1),
+        hovertemplate="%{x}<br>VWAP: %{y:,.2f} gil<br>Volume: %{customdata[0]:,}<br>Sales: %{customdata[1]}<extra>" + world + "</extra>"
+    )
+
+
+def _layout(fig, height=300, showlegend=False):
+    fig.update_layout(
+        xaxis_title="Date",
+        yaxis_title="Price (gil)",
+        height=height,
+        margin=dict(l=20, r=20, t=10, b=20),
+        showlegend=showlegend
+    )
+    return fig
+
+
+def build_world_figure(item_df, world, mode=CHART_MODE):
+    import plotly.graph_objs as go
+
+    with stage_timer("figure", world=world):
+        fig = go.Figure()
+        fig.add_trace(world_trace(item_df, world, mode))
+        return _layout(fig)
+
+
+def build_overlay_figure(frames, mode=CHART_MODE):
+    """All worlds in one figure. frames: {world: sales, see sales_columns}"""
+    import plotly.graph_objs as go
+
+    with stage_timer("overlay_figure"):
+        fig = go.Figure()
+        for world, sales in frames.items():
+            if sales is not None and len(sales):
+                fig.add_trace(world_trace(sales, world, mode))
+        return _layout(fig, height=450, showlegend=True)
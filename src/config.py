@@ -8,3 +8,128 @@ BASE_DIR = os.path.dirname(SRC_DIR)
 
 MODEL_PATH = os.path.join(BASE_DIR, "ffxiv_model.keras")      # Replace with your actual model filename
 SCALER_PATH = os.path.join(BASE_DIR, "ffxiv_model.keras_scaler.pkl")   # Replace with your actual scaler filename
+
+DC_WORLDS = {
+    "Aether": ["Adamantoise", "Cactuar", "Faerie", "Gilgamesh", "Jenova", "Midgardsormr", "Sargatanas", "Siren"],
+    "Crystal": ["Balmung", "Brynhildr", "Coeurl", "Diabolos", "Goblin", "Malboro", "Mateus", "Zalera"],
+    "Primal": ["Behemoth", "Excalibur", "Exodus", "Famfrit", "Hyperion", "Lamia", "Leviathan", "Ultros"],
+    "Dynamis": ["Halicarnassus", "Maduin", "Marilith", "Seraph"]
+}
+
+# Lookup fan-out: how many worlds are fetched/trained at once and how long a
+# single world may take before its card is reported as timed out.
+LOOKUP_MAX_WORKERS = int(os.environ.get("FFXIV_LOOKUP_MAX_WORKERS", 8))
+WORLD_TIMEOUT_SECONDS = float(os.environ.get("FFXIV_WORLD_TIMEOUT_SECONDS", 20))
+
+# "dc" fetches a lookup's history with one data-center request and only falls
+# back to per-world requests for worlds that response didn't cover; "world"
+# always makes one request per world.
+HISTORY_FETCH_MODE = os.environ.get("FFXIV_HISTORY_FETCH_MODE", "dc")
+
+# Fitted models are kept in memory per (world, item_id). Set FFXIV_MODEL_DIR to
+# also persist one artifact per key so other processes can pick them up.
+MODEL_CACHE_SIZE = int(os.environ.get("FFXIV_MODEL_CACHE_SIZE", 256))
+MODEL_DIR = os.environ.get("FFXIV_MODEL_DIR") or None
+
+# "batch" fits every world's price line in one vectorized pass
+# (batch_regression.py); "sklearn" fits the original pipeline per world.
+TRAINING_ENGINE = os.environ.get("FFXIV_TRAINING_ENGINE", "batch")
+
+# With the batch engine, a (world, item) that already has a model is updated
+# from sales newer than its last seen timestamp instead of refitted. The
+# updated fit slides over the same window a refit would use (the newest
+# HISTORY_READ_LIMIT stored sales, or 300 without the store).
+INCREMENTAL_TRAINING = os.environ.get("FFXIV_INCREMENTAL_TRAINING", "1") != "0"
+
+# Local SQLite store of every sale seen, per (world, item). Lookups sync only
+# entries newer than what is stored and read up to HISTORY_READ_LIMIT sales
+# back from it, which can reach further back than one 300-entry API window.
+HISTORY_STORE_ENABLED = os.environ.get("FFXIV_HISTORY_STORE", "1") != "0"
+HISTORY_DB_PATH = os.environ.get("FFXIV_HISTORY_DB", os.path.join(BASE_DIR, "history.sqlite3"))
+HISTORY_READ_LIMIT = int(os.environ.get("FFXIV_HISTORY_READ_LIMIT", 1000))
+
+# Upstream response cache. Entries are fresh for CACHE_TTL_SECONDS; for
+# CACHE_STALE_SECONDS after that the stale value is served while one
+# background refresh runs.
+CACHE_TTL_SECONDS = float(os.environ.get("FFXIV_CACHE_TTL_SECONDS", 60))
+CACHE_STALE_SECONDS = float(os.environ.get("FFXIV_CACHE_STALE_SECONDS", 0))
+CACHE_MAX_ENTRIES = int(os.environ.get("FFXIV_CACHE_MAX_ENTRIES", 1024))
+
+# Optional SQLite file shared by every worker process as a second cache tier
+# behind the in-process one, so N workers make one upstream call rather than
+# N. Off by default; wsgi.py turns it on. A worker waits up to
+# SHARED_CACHE_LEASE_SECONDS for another worker's in-flight load.
+SHARED_CACHE_PATH = os.environ.get("FFXIV_SHARED_CACHE") or None
+SHARED_CACHE_LEASE_SECONDS = float(os.environ.get("FFXIV_SHARED_CACHE_LEASE_SECONDS", 30))
+
+# Maximum number of matches the item search box offers per keystroke.
+ITEM_SEARCH_LIMIT = int(os.environ.get("FFXIV_ITEM_SEARCH_LIMIT", 50))
+
+# Item catalog builds (fetch_and_save_item_data): parallel XIVAPI requests
+# and items per page. The request rate is capped by HTTP_RATE_LIMITS.
+CATALOG_MAX_WORKERS = int(os.environ.get("FFXIV_CATALOG_MAX_WORKERS", 4))
+CATALOG_PAGE_SIZE = int(os.environ.get("FFXIV_CATALOG_PAGE_SIZE", 3000))
+
+# Bulk arbitrage scans (scanner.py): items per Universalis request (the API
+# accepts up to 100), sales kept per world and concurrent requests.
+SCAN_BATCH_SIZE = int(os.environ.get("FFXIV_SCAN_BATCH_SIZE", 100))
+SCAN_SALES_LIMIT = int(os.environ.get("FFXIV_SCAN_SALES_LIMIT", 50))
+SCAN_MAX_WORKERS = int(os.environ.get("FFXIV_SCAN_MAX_WORKERS", 4))
+
+# Multi-item data-center requests (scanner, JSON API) ask for at most this
+# many entries per item, however many worlds x sales that would take. In a
+# capped response a world with at least its share (this / worlds) of sales
+# counts as covered; the others are fetched per world, in batches.
+BATCH_ENTRIES_PER_ITEM = int(os.environ.get("FFXIV_BATCH_ENTRIES_PER_ITEM", 1000))
+
+# Precomputed per-(DC, world, item) prices written by precompute.py (and by
+# live lookups). The app serves an entry younger than
+# PREDICTION_MAX_AGE_SECONDS instead of running the pipeline.
+PREDICTION_DB_PATH = os.environ.get("FFXIV_PREDICTION_DB", os.path.join(BASE_DIR, "predictions.sqlite3"))
+PREDICTION_MAX_AGE_SECONDS = float(os.environ.get("FFXIV_PREDICTION_MAX_AGE_SECONDS", 900))
+PRECOMPUTE_WORKERS = int(os.environ.get("FFXIV_PRECOMPUTE_WORKERS", 4))
+
+# World charts: "raw" draws every sale as SVG lines+markers (the original
+# chart), "webgl" draws every sale with WebGL, "bucketed" draws WebGL
+# per-bucket VWAP with low/high whiskers, aggregated on the server.
+CHART_MODE = os.environ.get("FFXIV_CHART_MODE", "bucketed")
+CHART_BUCKET_SECONDS = int(os.environ.get("FFXIV_CHART_BUCKET_SECONDS", 3600))
+
+# Shared HTTP client (http_client.py). Requests per second and burst size per
+# host, kept under the documented Universalis and XIVAPI limits. The limits
+# are for the whole machine: every process (WSGI workers, precompute workers,
+# the scanner) takes its tokens from buckets in the HTTP_RATE_LIMIT_DB SQLite
+# file. Set FFXIV_RATE_LIMIT_DB to an empty string for per-process buckets.
+HTTP_RATE_LIMITS = {
+    "universalis.app": (float(os.environ.get("FFXIV_UNIVERSALIS_REQUESTS_PER_SECOND", 20)), 40),
+    "xivapi.com": (float(os.environ.get("FFXIV_XIVAPI_REQUESTS_PER_SECOND", 10)), 10),
+}
+HTTP_RATE_LIMIT_DB = os.environ.get("FFXIV_RATE_LIMIT_DB", os.path.join(BASE_DIR, "ratelimit.sqlite3")) or None
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("FFXIV_HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.environ.get("FFXIV_HTTP_READ_TIMEOUT", 30))
+HTTP_MAX_RETRIES = int(os.environ.get("FFXIV_HTTP_MAX_RETRIES", 4))
+HTTP_BACKOFF_BASE = float(os.environ.get("FFXIV_HTTP_BACKOFF_BASE", 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get("FFXIV_HTTP_BACKOFF_MAX", 20))
+HTTP_POOL_SIZE = int(os.environ.get("FFXIV_HTTP_POOL_SIZE", 16))
+
+# API roots; point these at a local stand-in (see bench_server.py) to run
+# without touching the real services.
+UNIVERSALIS_API_URL = os.environ.get("FFXIV_UNIVERSALIS_URL", "https://universalis.app/api/v2").rstrip("/")
+XIVAPI_URL = os.environ.get("FFXIV_XIVAPI_URL", "https://xivapi.com").rstrip("/")
+
+# Logging level for the app and tools (DEBUG also logs every timed stage) and
+# the latency histogram buckets, in seconds, exposed on /metrics.
+LOG_LEVEL = os.environ.get("FFXIV_LOG_LEVEL", "INFO").upper()
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Dash debug mode (dev tools and the reloader) for `python main.py`.
+DEBUG = os.environ.get("FFXIV_DEBUG", "0").lower() in ("1", "true", "yes")
+
+# In-memory series store (series_store.py): sales kept per (world, item), by
+# default as many as a world card shows, and the memory all series together
+# may use before the least recently used go.
+SERIES_CAPACITY = int(os.environ.get("FFXIV_SERIES_CAPACITY", HISTORY_READ_LIMIT))
+SERIES_MEMORY_BUDGET_MB = float(os.environ.get("FFXIV_SERIES_MEMORY_BUDGET_MB", 256))
+
+# Most items accepted by one /api/v1/lookup call.
+API_MAX_ITEMS = int(os.environ.get("FFXIV_API_MAX_ITEMS", 100))
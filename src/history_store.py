@@ -0,0 +1,175 @@
+'''
+HistoryStore
+
+Local SQLite store of Universalis sales per (world, item_id). Each successful
+sync records a watermark per (world, item_id), the time it asked Universalis.
+sync_world and sync_dc only ask for sales since then and deduplicate on
+insert, so repeat lookups download a handful of entries
+instead of the full window and the stored history keeps growing past the
+API's 300-entry window.
+'''
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import HISTORY_DB_PATH
+from response_cache import history_cache
+from DataAquisition import fetch_history_entries, split_dc_entries, sales_columns_to_frame
+from instrumentation import stage_timer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales (
+    world     TEXT    NOT NULL,
+    item_id   INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    price     INTEGER NOT NULL,
+    quantity  INTEGER NOT NULL,
+    hq        INTEGER NOT NULL,
+    buyer     TEXT    NOT NULL,
+    PRIMARY KEY (world, item_id, timestamp, price, quantity, hq, buyer)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS syncs (
+    world     TEXT    NOT NULL,
+    item_id   INTEGER NOT NULL,
+    synced_at INTEGER NOT NULL,
+    PRIMARY KEY (world, item_id)
+) WITHOUT ROWID;
+"""
+
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        # SQLite connections can't be shared across threads, so each thread
+        # in the lookup fan-out gets its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def insert_sales(self, world, item_id, sales):
+        """Insert raw history entries, skipping ones already stored."""
+        rows = [
+            (world, int(item_id), int(sale["timestamp"]), int(sale["pricePerUnit"]),
+             int(sale.get("quantity", 1)), int(bool(sale.get("hq"))), sale.get("buyerName") or "")
+            for sale in sales
+        ]
+        if not rows:
+            return 0
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO sales VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def latest_timestamp(self, world, item_id):
+        row = self._connect().execute(
+            "SELECT MAX(timestamp) FROM sales WHERE world = ? AND item_id = ?", (world, int(item_id))
+        ).fetchone()
+        return row[0]
+
+    def watermark(self, world, item_id):
+        """Time of the last successful sync, or None if there never was one.
+
+        A world synced before watermarks were recorded falls back to its
+        latest stored sale.
+        """
+        row = self._connect().execute(
+            "SELECT synced_at FROM syncs WHERE world = ? AND item_id = ?", (world, int(item_id))
+        ).fetchone()
+        return row[0] if row is not None else self.latest_timestamp(world, item_id)
+
+    def _mark_synced(self, worlds, item_id, synced_at):
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO syncs VALUES (?, ?, ?)",
+                             [(world, int(item_id), int(synced_at)) for world in worlds])
+
+    def read(self, world, item_id, limit=None) -> pd.DataFrame:
+        """Stored sales for one world, newest first like the history API."""
+        query = "SELECT timestamp, price, quantity FROM sales WHERE world = ? AND item_id = ? ORDER BY timestamp DESC"
+        params = [world, int(item_id)]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(int(limit))
+        with stage_timer("store_read", world=world):
+            rows = self._connect().execute(query, params).fetchall()
+            columns = np.array(rows, dtype=np.int64).reshape(-1, 3)
+            return sales_columns_to_frame(columns[:, 0], columns[:, 1], columns[:, 2], item_id, world)
+
+    @staticmethod
+    def _entries_within(watermark):
+        # +1 so a sale in the same second as the watermark is re-read (the
+        # insert dedupes it) rather than missed.
+        return max(1, int(time.time()) - int(watermark) + 1)
+
+    def sync_world(self, world, item_id, sales_limit=300):
+        """Pull sales newer than what is stored for one world.
+
+        Returns the number of new rows, or None if the request failed. If more
+        than sales_limit sales happened since the last sync, only the newest
+        sales_limit are fetched and the store has a gap before them. Syncs go
+        through history_cache, so within its TTL a repeat lookup makes no
+        upstream call and concurrent lookups share one.
+        """
+        return history_cache.get_or_load(
+            ("sync", self.path, world, int(item_id), int(sales_limit)),
+            lambda: self._sync_world(world, item_id, sales_limit)
+        )
+
+    def _sync_world(self, world, item_id, sales_limit):
+        watermark = self.watermark(world, item_id)
+        entries_within = self._entries_within(watermark) if watermark is not None else None
+        started = time.time()
+        sales = fetch_history_entries(world, item_id, sales_limit, entries_within)
+        if sales is None:
+            return None
+        added = self.insert_sales(world, item_id, sales[:sales_limit])
+        self._mark_synced([world], item_id, started)
+        return added
+
+    def sync_dc(self, dc_name, worlds, item_id, sales_limit=300):
+        """Sync every world of a data center with one request.
+
+        Returns the set of worlds the response fully covered; callers should
+        sync_world() the rest. Cached and coalesced like sync_world.
+        """
+        return history_cache.get_or_load(
+            ("sync", self.path, dc_name, int(item_id), int(sales_limit)),
+            lambda: self._sync_dc(dc_name, worlds, item_id, sales_limit)
+        )
+
+    def _sync_dc(self, dc_name, worlds, item_id, sales_limit):
+        # A world synced before counts even if it has never had a sale
+        watermarks = [self.watermark(world, item_id) for world in worlds]
+        incremental = all(mark is not None for mark in watermarks)
+        entries_within = self._entries_within(min(watermarks)) if incremental else None
+
+        requested = sales_limit * len(worlds)
+        started = time.time()
+        sales = fetch_history_entries(dc_name, item_id, requested, entries_within)
+        if sales is None:
+            return set()
+
+        # On an incremental sync a world with no entries just had no new sales
+        covered = split_dc_entries(sales, worlds, sales_limit, requested, allow_empty=incremental)
+        for world, world_sales in covered.items():
+            self.insert_sales(world, item_id, world_sales)
+        self._mark_synced(covered, item_id, started)
+        return set(covered)
+
+
+default_store = HistoryStore()
@@ -0,0 +1,168 @@
+'''
+http_client
+
+Shared HTTP client for Universalis and XIVAPI: one keep-alive connection pool
+per process, gzip, per-host token-bucket rate limiting, timeouts, and retries
+with exponential backoff and jitter on 429 and 5xx responses (honouring
+Retry-After). The token buckets live in a SQLite file (HTTP_RATE_LIMIT_DB)
+so every process on the machine shares one limit per host.
+'''
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_RATE_LIMITS, HTTP_RATE_LIMIT_DB, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT
+from config import HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE, HTTP_BACKOFF_MAX, HTTP_POOL_SIZE
+from instrumentation import default_metrics
+from shared_cache import SharedCache
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average with bursts of `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedTokenBucket:
+    """TokenBucket kept in a SharedCache file, so the rate is shared by every
+    process using the file. Falls back to a local bucket if the file can't be
+    used."""
+
+    def __init__(self, store, name, rate, capacity):
+        self.store = store
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._fallback = None
+
+    def acquire(self):
+        while self._fallback is None:
+            try:
+                wait = self.store.take_token(self.name, self.rate, self.capacity)
+            except sqlite3.Error as e:
+                logger.warning("Shared rate limit for %s unavailable (%s); limiting this process only", self.name, e)
+                self._fallback = TokenBucket(self.rate, self.capacity)
+                break
+            if wait <= 0:
+                return
+            time.sleep(wait)
+        self._fallback.acquire()
+
+
+_rate_limit_store = SharedCache(HTTP_RATE_LIMIT_DB) if HTTP_RATE_LIMIT_DB else None
+_session = None
+_session_pid = None
+_buckets = {}
+_lock = threading.Lock()
+
+
+def get_session():
+    # One pooled session per process; a forked worker builds its own rather
+    # than sharing the parent's sockets.
+    global _session, _session_pid
+    with _lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(HTTP_RATE_LIMITS) or 1, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "FF14MarketTool"})
+            _session = session
+            _session_pid = os.getpid()
+            _buckets.clear()
+        return _session
+
+
+def _bucket_for(url):
+    host = urlsplit(url).hostname or ""
+    for domain, (rate, burst) in HTTP_RATE_LIMITS.items():
+        if host == domain or host.endswith("." + domain):
+            with _lock:
+                bucket = _buckets.get(domain)
+                if bucket is None:
+                    if _rate_limit_store is not None:
+                        bucket = SharedTokenBucket(_rate_limit_store, domain, rate, burst)
+                    else:
+                        bucket = TokenBucket(rate, burst)
+                    _buckets[domain] = bucket
+            return bucket
+    return None
+
+
+def _backoff(attempt):
+    # Exponential backoff with "equal jitter": at least half the step, so
+    # retries from concurrent callers spread out without retrying instantly.
+    step = min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return min(HTTP_BACKOFF_MAX, max(0.0, float(value)))
+    except (TypeError, ValueError):
+        return None
+
+
+def get(url, params=None, timeout=None, max_retries=HTTP_MAX_RETRIES):
+    """GET url through the shared pool.
+
+    Returns the response; after max_retries retries a 429/5xx response is
+    returned as is and a connection error or timeout is raised, so callers
+    keep their existing status_code checks and exception handling.
+    """
+    session = get_session()
+    bucket = _bucket_for(url)
+    host = urlsplit(url).hostname
+    timeout = timeout or (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+    for attempt in range(max_retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        start = time.perf_counter()
+        try:
+            response = session.get(url, params=params, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            default_metrics.inc("ffxiv_http_requests_total", host=host, status=e.__class__.__name__)
+            if attempt == max_retries:
+                raise
+            delay = _backoff(attempt)
+            logger.warning("%s: %s, retrying in %.1fs", url, e.__class__.__name__, delay)
+        else:
+            # Upstream latency, separate from the rate limiter's wait above
+            default_metrics.observe("ffxiv_http_request_seconds", time.perf_counter() - start, host=host)
+            default_metrics.inc("ffxiv_http_requests_total", host=host, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == max_retries:
+                return response
+            delay = _retry_after(response) or _backoff(attempt)
+            logger.warning("%s: HTTP %s, retrying in %.1fs", url, response.status_code, delay)
+        default_metrics.inc("ffxiv_http_retries_total", host=host)
+        time.sleep(delay)
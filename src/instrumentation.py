@@ -0,0 +1,170 @@
+'''
+instrumentation
+
+Logging setup plus process-wide counters and latency histograms for the
+lookup pipeline. Stages are timed with
+
+    with stage_timer("fetch", world=world):
+        ...
+
+which records ffxiv_stage_seconds{stage, world} (and ffxiv_stage_errors_total
+if the block raised). MetricsRegistry.render() gives the Prometheus text
+format served on the app's /metrics route.
+'''
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from config import LOG_LEVEL, METRICS_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"
+
+
+def configure_logging(level=LOG_LEVEL):
+    # No-op for handlers if the host (e.g. a WSGI server) already set them up
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}    # name -> {label key: value}
+        self._histograms = {}  # name -> {label key: Histogram}
+        self._sources = {}     # prefix -> (callable returning {name: number}, counter names)
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def add_source(self, prefix, source, counters=()):
+        """Report source()'s {name: number} on every scrape.
+
+        Names in counters are running totals and are exported as counters
+        <prefix>_<name>_total; the rest are gauges <prefix>_<name>.
+        """
+        with self._lock:
+            self._sources[prefix] = (source, frozenset(counters))
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("ffxiv_stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("ffxiv_stage_seconds", elapsed, stage=stage, **labels)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("%s %s took %.1f ms", stage, _format_labels(_label_key(labels)), elapsed * 1000)
+
+    def snapshot(self):
+        """Plain-dict copy of every series, for tests and JSON consumers."""
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: {"count": h.count, "sum": h.sum} for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            sources = dict(self._sources)
+        return {
+            "counters": counters,
+            "histograms": histograms,
+            "sources": {prefix: source() for prefix, (source, _) in sources.items()},
+        }
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', f'{bound:g}')])} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+            sources = sorted(self._sources.items())
+
+        # Sources take their own locks, so they are read outside ours
+        for prefix, (source, counter_names) in sources:
+            try:
+                values = source()
+            except Exception:
+                logger.exception("Metrics source %s failed", prefix)
+                continue
+            for name, value in sorted(values.items()):
+                if name in counter_names:
+                    lines.append(f"# TYPE {prefix}_{name}_total counter")
+                    lines.append(f"{prefix}_{name}_total {value}")
+                else:
+                    lines.append(f"# TYPE {prefix}_{name} gauge")
+                    lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+default_metrics = MetricsRegistry()
+
+
+def stage_timer(stage, **labels):
+    return default_metrics.timer(stage, **labels)
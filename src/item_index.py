@@ -0,0 +1,134 @@
+'''
+ItemIndex
+
+In-memory index over the items.json catalog (name -> item ID). Resolves names
+case-insensitively with one dict lookup and serves the item search box:
+whole-name prefix matches first, then names whose words start with every word
+typed (so "iron ing" finds "Iron Ingot").
+
+load_catalog() keeps a pickled copy of the catalog and its index next to
+items.json, so startup skips parsing the JSON and rebuilding the index until
+items.json changes.
+'''
+import json
+import logging
+import os
+import pickle
+import re
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# Bump when ItemIndex's attributes change so stale pickles are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+_TOKEN_RE = re.compile(r"[\w']+")
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class ItemIndex:
+    def __init__(self, items: dict):
+        self.names = list(items.keys())
+        self.ids = [int(item_id) for item_id in items.values()]
+
+        # First spelling wins if two names only differ by case
+        self._by_lower = {}
+        for position, name in enumerate(self.names):
+            self._by_lower.setdefault(name.lower(), position)
+
+        self._sorted_lower = sorted((name.lower(), position) for position, name in enumerate(self.names))
+
+        postings = {}
+        for position, name in enumerate(self.names):
+            for token in set(_tokens(name)):
+                postings.setdefault(token, []).append(position)
+        self._tokens = sorted(postings)
+        self._postings = postings
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name.lower() in self._by_lower
+
+    def id_for(self, name):
+        position = self._by_lower.get(name.strip().lower())
+        return self.ids[position] if position is not None else None
+
+    def _positions_with_token_prefix(self, prefix):
+        matches = set()
+        start = bisect_left(self._tokens, prefix)
+        for token in self._tokens[start:]:
+            if not token.startswith(prefix):
+                break
+            matches.update(self._postings[token])
+        return matches
+
+    def search(self, query, limit=50):
+        """Up to limit item names matching query, best matches first."""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        results = []
+        seen = set()
+        start = bisect_left(self._sorted_lower, (query,))
+        for lowered, position in self._sorted_lower[start:]:
+            if len(results) >= limit or not lowered.startswith(query):
+                break
+            results.append(self.names[position])
+            seen.add(position)
+
+        if len(results) < limit:
+            candidates = None
+            for token in _tokens(query):
+                matches = self._positions_with_token_prefix(token)
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    break
+            if candidates:
+                # Shorter names first: "Iron Ingot" before "Iron Ingot Mold"
+                ranked = sorted(candidates - seen, key=lambda p: (len(self.names[p]), self.names[p]))
+                results.extend(self.names[p] for p in ranked[:limit - len(results)])
+
+        return results
+
+
+def _catalog_signature(path):
+    stat = os.stat(path)
+    return INDEX_FORMAT_VERSION, stat.st_size, stat.st_mtime_ns
+
+
+def load_catalog(path, cache_path=None):
+    """(items, ItemIndex) for the items.json catalog at path.
+
+    Served from cache_path (default: <path without .json>.index.pickle) while
+    items.json keeps the size and mtime it was built from; otherwise the JSON
+    is parsed, indexed and the cache rewritten.
+    """
+    cache_path = cache_path or f"{os.path.splitext(path)[0]}.index.pickle"
+    signature = _catalog_signature(path)
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached[0] == signature:
+            return cached[1], cached[2]
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, IndexError, TypeError):
+        pass
+
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    index = ItemIndex(items)
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            pickle.dump((signature, items, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not write item index cache %s: %s", cache_path, e)
+    return items, index
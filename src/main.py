@@ -1,54 +1,200 @@
-import json
+import logging
 import os
 import dash
 from dash import html, dcc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, MATCH, ALL
+from dash.exceptions import PreventUpdate
 import pandas as pd
-import plotly.graph_objs as go
-from DataAquisition import fetch_top_sales_data, train_and_save_model
-from prediction_util import predict_next_price_from_model
+from flask import Response
+from api import register_api
+from charts import build_world_figure, build_overlay_figure
+from history_store import default_store
+from item_index import ItemIndex, load_catalog
+from market_engine import lookup_world, load_world_frame
+from market_summary import best_buy_servers, best_sell_servers
+from prediction_table import default_prediction_table
+from response_cache import history_cache
+from series_store import default_series_store
+from instrumentation import configure_logging, default_metrics, stage_timer
+from config import DC_WORLDS, DEBUG
+from config import HISTORY_STORE_ENABLED, HISTORY_READ_LIMIT, ITEM_SEARCH_LIMIT
+
+
+logger = logging.getLogger(__name__)
 
-
-
-DC_WORLDS = {
-    "Aether": ["Adamantoise", "Cactuar", "Faerie", "Gilgamesh", "Jenova", "Midgardsormr", "Sargatanas", "Siren"],
-    "Crystal": ["Balmung", "Brynhildr", "Coeurl", "Diabolos", "Goblin", "Malboro", "Mateus", "Zalera"],
-    "Primal": ["Behemoth", "Excalibur", "Exodus", "Famfrit", "Hyperion", "Lamia", "Leviathan", "Ultros"],
-    "Dynamis": ["Halicarnassus", "Maduin", "Marilith", "Seraph"]
-}
 item_data = {}
+item_index = ItemIndex({})
 
 def load_item_data():
-    global item_data
+    global item_data, item_index
     file_path = os.path.join(os.path.dirname(__file__), "items.json")
     if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            item_data = json.load(f)
-        print(f"Loaded {len(item_data)} items from {file_path}")
+        item_data, item_index = load_catalog(file_path)
+        logger.info("Loaded %d items from %s", len(item_data), file_path)
     else:
-        print(f"items.json not found at: {file_path}")
+        logger.warning("items.json not found at: %s", file_path)
         item_data = {}
+        item_index = ItemIndex(item_data)
 
 def get_item_id_from_name(name):
-    global item_data
-    load_item_data()
-    for item_name, item_id in item_data.items():
-        if item_name.lower() == name.lower():
-            return int(item_id)
-    return None
+    # The catalog is loaded once at startup; load lazily if called before that.
+    if not item_data:
+        load_item_data()
+    return item_index.id_for(name)
+
+def build_world_body(world, item_df=None, summary=None, error=None):
+    # Chart + stats shown inside one world's card
+    if error is not None:
+        graph = html.Div(f"Error for {world}: {str(error)}", style={"color": "red"})
+        stats_div = html.Div()
+    elif summary is None:
+        graph = html.Div(f"No sales found for {world}")
+        stats_div = html.Div()
+    else:
+        current_price = summary["current_price"]
+        predicted_price = summary["predicted_price"]
+
+        # Build graph
+        if item_df is None or item_df.empty:
+            graph = html.Div("No chart data stored for this world.")
+        else:
+            graph = dcc.Graph(figure=build_world_figure(item_df, world))
+
+        # Stats text
+        min_price = summary["min_price"]
+        max_price = summary["max_price"]
+
+        predicted_text = f"Predicted Next Sale: {predicted_price:,.2f}" if predicted_price is not None else ""
+        stats_text = html.Div([
+            html.Div(f"Highest Sale: {max_price:,}"),
+            html.Div(f"--------------------"),
+            html.Div(f"Lowest Sale: {min_price:,}"),
+            html.Div(f"--------------------"),
+            html.Div(f"Current Price: {current_price:,}"),
+            html.Div(f"--------------------"),
+            html.Div(predicted_text)
+        ])
+        stats_div = html.Div(
+            stats_text,
+            style={"textAlign": "center", "fontWeight": "bold", "marginTop": "6px"}
+        )
 
-def run_dash_app():
+    return html.Div([
+        html.Div(graph, style={"flex": "3"}),
+        html.Div(stats_div, style={"flex": "1", "paddingLeft": "10px"})
+    ], style={"display": "flex", "flexDirection": "row", "alignItems": "center"})
+
+def build_world_placeholder(world, request):
+    # Card shell whose body render_world_card fills in; the request store
+    # is what triggers that callback.
+    return html.Div(
+        [
+            html.H4(world, style={
+                "textAlign": "center",
+                "fontWeight": "bold",
+                "fontSize": "20px",
+                "backgroundColor": "#d6d3d3",
+                "marginBottom": "10px",
+                "color": "#2a2a2a"
+            }),
+            dcc.Store(id={"type": "world-request", "world": world}, data=request),
+            dcc.Store(id={"type": "world-result", "world": world}),
+            dcc.Loading(
+                type="cube",
+                children=html.Div(id={"type": "world-card", "world": world}, style={"minHeight": "300px"})
+            )
+        ],
+        style={
+            "flex": "1",
+            "minWidth": "300px",
+            "maxWidth": "100%",
+            "padding": "10px",
+            "boxSizing": "border-box",
+            "border": "1px solid #ccc",
+            "borderRadius": "8px",
+            "backgroundColor": "#d6d3d3"
+        }
+    )
+
+def build_world_rows(blocks):
+    # Three cards per row
+    rows = []
+    for i in range(0, len(blocks), 3):
+        rows.append(html.Div(blocks[i:i + 3], style={
+            "display": "flex",
+            "justifyContent": "center",
+            "flexWrap": "wrap",
+            "marginBottom": "20px"
+        }))
+    return rows
+
+def build_summary(current_prices, predicted_prices, finished=None, total=None):
+    top_servers = best_buy_servers(current_prices)
+    buy_summary_block = html.Div(
+        [
+            html.H3("Top 3 Servers (Lowest Current Price)", style={"textAlign": "center"}),
+            html.Ul([html.Li(f"{server}: {price:,} gil") for server, price in top_servers],
+                    style={"listStyleType": "none", "padding": 0, "textAlign": "center"})
+        ],
+        style={
+            "padding": "10px",
+            "marginBottom": "20px",
+            "backgroundColor": "#e6f7ff",
+            "borderRadius": "8px",
+            "textAlign": "center",
+            "boxShadow": "0px 2px 6px rgba(0,0,0,0.1)"
+        }
+    )
+
+    best_sell = best_sell_servers(predicted_prices)
+    sell_summary_block = html.Div(
+        [
+            html.H3("Top 3 Servers to Sell On (Highest Predicted Price)", style={"textAlign": "center"}),
+            html.Ul([html.Li(f"{server}: {price:,.2f} gil (Predicted Next Price)") for server, price in best_sell],
+                    style={"listStyleType": "none", "padding": 0, "textAlign": "center"})
+        ],
+        style={
+            "padding": "10px",
+            "marginBottom": "20px",
+            "backgroundColor": "#fff2e6",
+            "borderRadius": "8px",
+            "textAlign": "center",
+            "boxShadow": "0px 2px 6px rgba(0,0,0,0.1)"
+        }
+    )
+
+    combined_summary = html.Div(
+        [buy_summary_block, sell_summary_block],
+        style={
+            "display": "flex",
+            "justifyContent": "space-around",
+            "maxWidth": "900px",
+            "margin": "auto"
+        }
+    )
+
+    if finished is not None and total and finished < total:
+        progress = html.Div(f"{finished} of {total} worlds loaded...", style={"textAlign": "center", "fontStyle": "italic"})
+        return html.Div([progress, combined_summary])
+    return combined_summary
+
+def create_app():
     global item_data
+    configure_logging()
     load_item_data()
 
 
     app = dash.Dash(__name__)
     app.title = "FFXIV Market Tool"
 
-    # Prepare dropdown options (first 100 items)
-    def get_dropdown_options(filter_value=""):
-        filtered = list(item_data.keys())
-        return [{"label": name, "value": name} for name in filtered]
+    default_metrics.add_source("ffxiv_history_cache", history_cache.stats,
+                               counters=("hits", "misses", "coalesced", "stale_hits", "shared_hits"))
+
+    @app.server.route("/metrics")
+    def metrics():
+        return Response(default_metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    register_api(app.server, get_item_id_from_name)
 
     app.layout = html.Div(
         children=[
@@ -84,7 +230,8 @@ def run_dash_app():
                         html.Label("Type your Item here:", style={"fontWeight": "bold", "marginBottom": "5px", "color": "#1870a7"}),
                         dcc.Dropdown(
                             id="item-name-dropdown",
-                            options=get_dropdown_options(),
+                            # Filled per keystroke by update_item_options
+                            options=[],
                             placeholder="Start typing item name...",
                             searchable=True,
                             clearable=True,
@@ -98,7 +245,13 @@ def run_dash_app():
                             debounce=True
                         )
                     ]),
-                    html.Button("Lookup Item", id="lookup-btn", n_clicks=0, style={"marginLeft": "10px", "height": "38px", "backgroundColor": "#d6d3d3"})
+                    html.Button("Lookup Item", id="lookup-btn", n_clicks=0, style={"marginLeft": "10px", "height": "38px", "backgroundColor": "#d6d3d3"}),
+                    dcc.Checklist(
+                        id="chart-options",
+                        options=[{"label": " Overlay all worlds", "value": "overlay"}],
+                        value=[],
+                        style={"marginLeft": "10px", "color": "#1870a7", "fontWeight": "bold"}
+                    )
                 ], style={"display": "flex", "alignItems": "center"})
             ],
             style={
@@ -110,18 +263,16 @@ def run_dash_app():
                 "paddingBottom": "20px"
             }),
 
-            dcc.Loading(
-                id="loading-spinner",
-                type="cube",
-                fullscreen=True,
-                children=html.Div(
-                    id="loading-wrapper",
-                    children=[
-                        html.Div(id="item-id-output", style={"marginRight": "20px", "fontWeight": "bold"}),
-                        html.Div(id="summary-container", style={"marginTop": "20px"}),
-                        html.Div(id="sales-output", style={"marginTop": "20px"})
-                    ]
-                )
+            # Each world card has its own spinner (build_world_placeholder), so
+            # worlds show up as they finish instead of behind one fullscreen one.
+            html.Div(
+                id="loading-wrapper",
+                children=[
+                    html.Div(id="lookup-message", style={"marginRight": "20px", "fontWeight": "bold"}),
+                    html.Div(id="summary-container", style={"marginTop": "20px"}),
+                    html.Div(id="overlay-output", style={"marginTop": "20px"}),
+                    html.Div(id="sales-output", style={"marginTop": "20px"})
+                ]
             ),
 
             html.Hr()
@@ -134,115 +285,23 @@ def run_dash_app():
     )
 
     
-    def get_sales_by_worlds(worlds, item_id):
-        rows = []
-        current_row = []
-        top_servers = []  # For lowest current price
-        predicted_prices_list = []  # For highest predicted price
-
-        for i, world in enumerate(worlds):
-            try:
-                item_df = fetch_top_sales_data(world, item_id, sales_limit=300)
-                if item_df.empty:
-                    graph = html.Div(f"No sales found for {world}")
-                    stats_div = html.Div()
-                else:
-                    current_price = item_df['Price'].iloc[-1]
-                    top_servers.append((world, current_price))
-
-                    train_and_save_model(world, item_id)
-
-                    try:
-                        print(f"Model trained and saved for {world} - Item ID: {item_id}")
-                        predicted_price = predict_next_price_from_model(item_df)
-                    except Exception as e:
-                        predicted_price = None
-                        print(f"Prediction error for {world}: {e}")
-
-                    if predicted_price is not None:
-                        predicted_prices_list.append((world, predicted_price))
-
-                    # Build graph
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(
-                        x=pd.to_datetime(item_df['Timestamp'], unit='s'),
-                        y=item_df['Price'],
-                        mode='lines+markers',
-                        name=world
-                    ))
-                    fig.update_layout(
-                        xaxis_title="Date",
-                        yaxis_title="Price (gil)",
-                        height=300,
-                        margin=dict(l=20, r=20, t=10, b=20)
-                    )
-                    graph = dcc.Graph(figure=fig)
-
-                    # Stats text
-                    min_price = item_df['Price'].min()
-                    max_price = item_df['Price'].max()
-
-                    predicted_text = f"Predicted Next Sale: {predicted_price:,.2f}" if predicted_price is not None else ""
-                    stats_text = html.Div([
-                        html.Div(f"Highest Sale: {max_price:,}"),
-                        html.Div(f"--------------------"),
-                        html.Div(f"Lowest Sale: {min_price:,}"),
-                        html.Div(f"--------------------"),
-                        html.Div(f"Current Price: {current_price:,}"),
-                        html.Div(f"--------------------"),
-                        html.Div(predicted_text)
-                    ])
-                    stats_div = html.Div(
-                        stats_text,
-                        style={"textAlign": "center", "fontWeight": "bold", "marginTop": "6px"}
-                    )
-            except Exception as e:
-                graph = html.Div(f"Error for {world}: {str(e)}", style={"color": "red"})
-                stats_div = html.Div()
-
-            block = html.Div(
-                [
-                    html.H4(world, style={
-                        "textAlign": "center",
-                        "fontWeight": "bold",
-                        "fontSize": "20px",
-                        "backgroundColor": "#d6d3d3",
-                        "marginBottom": "10px",
-                        "color": "#2a2a2a"
-                    }),
-                    html.Div([
-                        html.Div(graph, style={"flex": "3"}),
-                        html.Div(stats_div, style={"flex": "1", "paddingLeft": "10px"})
-                    ], style={"display": "flex", "flexDirection": "row", "alignItems": "center"})
-                ],
-                style={
-                    "flex": "1",
-                    "minWidth": "300px",
-                    "maxWidth": "100%",
-                    "padding": "10px",
-                    "boxSizing": "border-box",
-                    "border": "1px solid #ccc",
-                    "borderRadius": "8px",
-                    "backgroundColor": "#d6d3d3"
-                }
-            )
-
-
-            current_row.append(block)
-
-            if (i + 1) % 3 == 0 or i == len(worlds) - 1:
-                rows.append(html.Div(current_row, style={
-                    "display": "flex",
-                    "justifyContent": "center",
-                    "flexWrap": "wrap",
-                    "marginBottom": "20px"
-                }))
-                current_row = []
+    @app.callback(
+        Output("item-name-dropdown", "options"),
+        Input("item-name-dropdown", "search_value"),
+        State("item-name-dropdown", "value")
+    )
+    def update_item_options(search_value, selected_item_name):
+        if not search_value:
+            raise PreventUpdate
 
-        return rows, top_servers, predicted_prices_list
+        names = item_index.search(search_value, limit=ITEM_SEARCH_LIMIT)
+        # Keep the current selection in the list so the dropdown can still display it
+        if selected_item_name and selected_item_name not in names:
+            names.append(selected_item_name)
+        return [{"label": name, "value": name} for name in names]
 
     @app.callback(
-        Output("summary-container", "children"),
+        Output("lookup-message", "children"),
         Output("sales-output", "children"),
         Input("lookup-btn", "n_clicks"),
         Input("enter-catcher", "n_submit"),
@@ -250,6 +309,8 @@ def run_dash_app():
         State("item-name-dropdown", "value")
     )
     def update_all_outputs(n_clicks, n_submit, selected_dc, selected_item_name):
+        # Only lays out one placeholder card per world; render_world_card
+        # fills each one in as that world's data arrives.
         if n_clicks == 0:
             return "", ""
 
@@ -262,60 +323,114 @@ def run_dash_app():
         item_id = get_item_id_from_name(selected_item_name)
         if not item_id:
             return "Item not found. Try updating the list or check spelling.", ""
-        
-        # item_id_output = f"Item ID for '{selected_item_name}': {item_id}"
 
         worlds = DC_WORLDS[selected_dc]
+        request = {"dc": selected_dc, "item_id": item_id, "n": n_clicks}
+        default_metrics.inc("ffxiv_lookups_total", dc=selected_dc)
+        with stage_timer("layout"):
+            return "", html.Div(build_world_rows([
+                build_world_placeholder(world, dict(request, world=world)) for world in worlds
+            ]))
 
-        graph_blocks, current_prices, predicted_prices = get_sales_by_worlds(worlds, item_id)
+    @app.callback(
+        Output({"type": "world-card", "world": MATCH}, "children"),
+        Output({"type": "world-result", "world": MATCH}, "data"),
+        Input({"type": "world-request", "world": MATCH}, "data")
+    )
+    def render_world_card(request):
+        if not request:
+            raise PreventUpdate
+
+        world, dc_name, item_id = request["world"], request["dc"], request["item_id"]
+        worlds = DC_WORLDS[dc_name]
+
+        with stage_timer("render_world", world=world):
+            precomputed = default_prediction_table.lookup(dc_name, item_id, worlds)
+            if precomputed is not None:
+                # Precomputed numbers; the chart comes from the local history store
+                default_metrics.inc("ffxiv_world_lookups_total", source="precomputed")
+                summary = precomputed.get(world)
+                result = default_store.read(world, item_id, limit=HISTORY_READ_LIMIT) if HISTORY_STORE_ENABLED else pd.DataFrame()
+            else:
+                default_metrics.inc("ffxiv_world_lookups_total", source="live")
+                result, summary = lookup_world(world, item_id, dc_name, worlds)
+                if not isinstance(result, Exception):
+                    default_prediction_table.upsert(dc_name, item_id, [world], {world: summary})
+
+            with stage_timer("layout", world=world):
+                if isinstance(result, Exception):
+                    return build_world_body(world, error=result), {"world": world, "done": True}
+                done = dict(summary or {}, world=world, done=True)
+                if not result.empty:
+                    # Kept for the overlay, which reads it back as a view
+                    default_series_store.extend(world, item_id, result["Timestamp"].to_numpy(),
+                                                result["Price"].to_numpy(), result["Quantity"].to_numpy())
+                    done["last_sale"] = int(result["Timestamp"].max())
+                return build_world_body(world, result, summary), done
 
-        top_servers = sorted(current_prices, key=lambda x: x[1])[:3]
-        buy_summary_block = html.Div(
-            [
-                html.H3("Top 3 Servers (Lowest Current Price)", style={"textAlign": "center"}),
-                html.Ul([html.Li(f"{server}: {price:,} gil") for server, price in top_servers],
-                        style={"listStyleType": "none", "padding": 0, "textAlign": "center"})
-            ],
-            style={
-                "padding": "10px",
-                "marginBottom": "20px",
-                "backgroundColor": "#e6f7ff",
-                "borderRadius": "8px",
-                "textAlign": "center",
-                "boxShadow": "0px 2px 6px rgba(0,0,0,0.1)"
-            }
-        )
+    @app.callback(
+        Output("summary-container", "children"),
+        Input({"type": "world-result", "world": ALL}, "data")
+    )
+    def update_summary(world_results):
+        # Re-ranks every time another world finishes
+        if not world_results:
+            return ""
 
-        best_sell_servers = sorted(predicted_prices, key=lambda x: x[1], reverse=True)[:3]
-        sell_summary_block = html.Div(
-            [
-                html.H3("Top 3 Servers to Sell On (Highest Predicted Price)", style={"textAlign": "center"}),
-                html.Ul([html.Li(f"{server}: {price:,.2f} gil (Predicted Next Price)") for server, price in best_sell_servers],
-                        style={"listStyleType": "none", "padding": 0, "textAlign": "center"})
-            ],
-            style={
-                "padding": "10px",
-                "marginBottom": "20px",
-                "backgroundColor": "#fff2e6",
-                "borderRadius": "8px",
-                "textAlign": "center",
-                "boxShadow": "0px 2px 6px rgba(0,0,0,0.1)"
-            }
-        )
+        finished = [result for result in world_results if result and result.get("done")]
+        current_prices = [(r["world"], r["current_price"]) for r in finished if r.get("current_price") is not None]
+        predicted_prices = [(r["world"], r["predicted_price"]) for r in finished if r.get("predicted_price") is not None]
+        return build_summary(current_prices, predicted_prices, len(finished), len(world_results))
 
-        combined_summary = html.Div(
-            [buy_summary_block, sell_summary_block],
-            style={
-                "display": "flex",
-                "justifyContent": "space-around",
-                "maxWidth": "900px",
-                "margin": "auto"
-            }
+    @app.callback(
+        Output("overlay-output", "children"),
+        Input("chart-options", "value"),
+        Input({"type": "world-result", "world": ALL}, "data"),
+        State({"type": "world-request", "world": ALL}, "data")
+    )
+    def update_overlay(chart_options, world_results, world_requests):
+        if "overlay" not in (chart_options or []) or not world_requests:
+            return ""
+        # Built once, after the last world card; until then (including while
+        # a new lookup loads) there's no overlay.
+        if not all(result and result.get("done") for result in world_results):
+            return ""
+
+        # Only worlds that finished with sales. Their cards left the sales in
+        # the series store; each is copied out under the store's lock, since
+        # another card for the same item may be writing to it. A world this
+        # process doesn't have up to the card's last sale (another worker
+        # drew the card, or it was evicted) is loaded again, which normally
+        # doesn't go back to Universalis.
+        finished = {result["world"]: result.get("last_sale") for result in world_results
+                    if result.get("current_price") is not None}
+        frames = {}
+        for request in world_requests:
+            if not request or request["world"] not in finished:
+                continue
+            world, item_id = request["world"], request["item_id"]
+            records = default_series_store.snapshot(world, item_id)
+            if records is not None and len(records) and finished[world] is not None \
+                    and int(records["timestamp"][-1]) >= finished[world]:
+                frames[world] = records
+                continue
+            try:
+                frames[world] = load_world_frame(world, item_id, request["dc"])
+            except Exception as e:
+                logger.error("Overlay error for %s: %s", world, e)
+        if not frames:
+            return ""
+
+        return html.Div(
+            dcc.Graph(figure=build_overlay_figure(frames)),
+            style={"backgroundColor": "#d6d3d3", "borderRadius": "8px", "padding": "10px"}
         )
 
-        return combined_summary, html.Div(graph_blocks)
+    return app
 
-    app.run(debug=True)
+def run_dash_app():
+    # Development server; use wsgi.py for production
+    create_app().run(debug=DEBUG)
 
 if __name__ == "__main__":
     run_dash_app()
\ No newline at end of file
@@ -0,0 +1,218 @@
+'''
+market_engine
+
+The lookup pipeline behind the Dash app, without any UI: load each world's
+sales history (data-center fetch, history store and per-world fallbacks run
+concurrently), train one model per world in a single pass and predict the
+next price. Used by main.py, the precompute job, the JSON API and the batch
+tools.
+'''
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from DataAquisition import fetch_top_sales_data, fetch_dc_sales_data, train_and_register_models
+from DataAquisition import fetch_dc_entries_many, sales_to_frame
+from batch_regression import fit_series
+from prediction_util import predict_next_prices
+from history_store import default_store
+from market_summary import current_price, NEXT_SALE_OFFSET
+from config import DC_WORLDS
+from config import LOOKUP_MAX_WORKERS, WORLD_TIMEOUT_SECONDS, HISTORY_FETCH_MODE
+from config import HISTORY_STORE_ENABLED, HISTORY_READ_LIMIT
+from config import SCAN_BATCH_SIZE, SCAN_MAX_WORKERS
+from instrumentation import stage_timer
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_world_history(world, item_id, item_df=None):
+    # item_df is the world's slice of a data-center response when there is one
+    if item_df is None:
+        item_df = fetch_top_sales_data(world, item_id, sales_limit=300)
+    return item_df
+
+def sync_world_history(world, item_id, synced_worlds=()):
+    # Worlds already covered by the data-center sync only need the local read.
+    # If the sync fails the stored history is still served.
+    if world not in synced_worlds:
+        default_store.sync_world(world, item_id, sales_limit=300)
+    return default_store.read(world, item_id, limit=HISTORY_READ_LIMIT)
+
+def train_and_predict_worlds(frames):
+    # One training pass over every world that returned sales, then one batch
+    # prediction. Returns {world: predicted next price}.
+    try:
+        train_and_register_models(frames)
+        return predict_next_prices(frames)
+    except Exception as e:
+        logger.error("Prediction error: %s", e)
+        return {}
+
+def run_worlds_concurrently(worlds, task, max_workers=LOOKUP_MAX_WORKERS, timeout=WORLD_TIMEOUT_SECONDS):
+    """Run task(world) for every world on a bounded thread pool.
+
+    Returns {world: result}; a world that raised or ran longer than timeout
+    seconds (counted from when it started, not when it was queued) maps to
+    the exception instead, so one bad world never holds up the others.
+    """
+    if not worlds:
+        return {}
+
+    started = {}
+
+    def run(world):
+        started[world] = time.monotonic()
+        return task(world)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(worlds))))
+    futures = {executor.submit(run, world): world for world in worlds}
+    pending = set(futures)
+    results = {}
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+            for future in done:
+                world = futures[future]
+                try:
+                    results[world] = future.result()
+                except Exception as e:
+                    results[world] = e
+
+            now = time.monotonic()
+            for future in list(pending):
+                world = futures[future]
+                if world in started and now - started[world] > timeout:
+                    results[world] = TimeoutError(f"Timed out after {timeout:g}s")
+                    pending.discard(future)
+    finally:
+        # Don't wait on stragglers that already timed out.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+def load_world_frame(world, item_id, dc_name=None, worlds=None):
+    """One world's sales history, for callers that handle worlds separately.
+
+    The data-center request is cached and coalesced (history_cache), so when
+    every world of a lookup calls this at once only one of them hits
+    Universalis and the rest share its response.
+    """
+    worlds = worlds or DC_WORLDS.get(dc_name, [world])
+    use_dc = dc_name and HISTORY_FETCH_MODE == "dc"
+    if HISTORY_STORE_ENABLED:
+        synced = default_store.sync_dc(dc_name, worlds, item_id, sales_limit=300) if use_dc else set()
+        return sync_world_history(world, item_id, synced)
+
+    prefetched = fetch_dc_sales_data(dc_name, worlds, item_id, sales_limit=300, only=(world,)) if use_dc else {}
+    return fetch_world_history(world, item_id, prefetched.get(world))
+
+def load_world_frames(worlds, item_id, dc_name=None):
+    """{world: sales DataFrame, or the exception that world failed with}."""
+    use_dc = dc_name and HISTORY_FETCH_MODE == "dc"
+    if HISTORY_STORE_ENABLED:
+        synced = default_store.sync_dc(dc_name, worlds, item_id, sales_limit=300) if use_dc else set()
+        task = lambda world: sync_world_history(world, item_id, synced)
+    else:
+        prefetched = fetch_dc_sales_data(dc_name, worlds, item_id, sales_limit=300) if use_dc else {}
+        task = lambda world: fetch_world_history(world, item_id, prefetched.get(world))
+
+    return run_worlds_concurrently(worlds, task)
+
+def summarize_world(item_df, predicted_price=None):
+    # The per-world numbers shown on a world card
+    return {
+        "current_price": int(current_price(item_df)),
+        "min_price": int(item_df['Price'].min()),
+        "max_price": int(item_df['Price'].max()),
+        "predicted_price": float(predicted_price) if predicted_price is not None else None,
+    }
+
+def lookup_item(worlds, item_id, dc_name=None):
+    """Run the full pipeline for one item.
+
+    Returns (results, summaries): results is load_world_frames() output and
+    summaries maps each world that had sales to summarize_world() output.
+    """
+    with stage_timer("load"):
+        results = load_world_frames(worlds, item_id, dc_name)
+    frames = {
+        world: result for world, result in results.items()
+        if not isinstance(result, Exception) and not result.empty
+    }
+    predicted_prices = train_and_predict_worlds(frames)
+    summaries = {world: summarize_world(df, predicted_prices.get(world)) for world, df in frames.items()}
+    return results, summaries
+
+def lookup_world(world, item_id, dc_name=None, worlds=None):
+    """lookup_item() for a single world, with the same per-world timeout.
+
+    Returns (result, summary): the world's sales frame (or the exception it
+    failed with) and its summarize_world() output, None if it had no sales.
+    """
+    with stage_timer("lookup_world", world=world):
+        with stage_timer("load", world=world):
+            result = run_worlds_concurrently([world], lambda w: load_world_frame(w, item_id, dc_name, worlds))[world]
+        if isinstance(result, Exception) or result.empty:
+            return result, None
+
+        predicted_price = train_and_predict_worlds({world: result}).get(world)
+        return result, summarize_world(result, predicted_price)
+
+def load_item_frames(worlds, item_ids, dc_name, batch_size=SCAN_BATCH_SIZE, max_workers=SCAN_MAX_WORKERS):
+    """{(world, item_id): sales frame} for many items of one data center.
+
+    Loaded with fetch_dc_entries_many, like the scanner. With the history
+    store enabled the sales are stored and read back from it, so the frames
+    match what the app shows. Worlds whose request failed are left out;
+    worlds without sales map to empty frames.
+    """
+    sales = fetch_dc_entries_many(dc_name, worlds, item_ids, 300, batch_size, max_workers)
+
+    if HISTORY_STORE_ENABLED:
+        for (world, item_id), world_sales in sales.items():
+            default_store.insert_sales(world, item_id, world_sales)
+        return {key: default_store.read(*key, limit=HISTORY_READ_LIMIT) for key in sales}
+    return {(world, item_id): sales_to_frame(world_sales, item_id, world) for (world, item_id), world_sales in sales.items()}
+
+def lookup_items(worlds, item_ids, dc_name):
+    """lookup_item() for many items at once, sharing fetches and fits.
+
+    History is loaded with load_item_frames() and every (world, item) series
+    is fitted in one batch_regression pass. Returns {item_id: {world:
+    summarize_world() output}} for the items every world could be loaded
+    for; like precompute, an answer with failed worlds is left out.
+    """
+    with stage_timer("load_many"):
+        frames = load_item_frames(worlds, item_ids, dc_name)
+
+    loaded = {}
+    for world, item_id in frames:
+        loaded[item_id] = loaded.get(item_id, 0) + 1
+    summaries = {item_id: {} for item_id, count in loaded.items() if count == len(worlds)}
+    frames = {key: df for key, df in frames.items() if key[1] in summaries and not df.empty}
+    if not frames:
+        return summaries
+
+    with stage_timer("train_many"):
+        # Stacked by hand: concatenating hundreds of single-world frames is
+        # slower than the fit itself.
+        lengths = [len(df) for df in frames.values()]
+        stacked = pd.DataFrame({
+            "Server": np.repeat(np.array([world for world, _ in frames], dtype=object), lengths),
+            "ItemID": np.repeat(np.array([item_id for _, item_id in frames], dtype=np.int64), lengths),
+            "Timestamp": np.concatenate([df["Timestamp"].to_numpy() for df in frames.values()]),
+            "Price": np.concatenate([df["Price"].to_numpy() for df in frames.values()]),
+        })
+        models = fit_series(stacked)
+
+    with stage_timer("predict_many"):
+        for (world, item_id), df in frames.items():
+            # Same reference row as next_day_features: the newest sale
+            next_timestamp = int(df["Timestamp"].max()) + NEXT_SALE_OFFSET
+            predicted = models[(world, item_id)].predict(np.array([next_timestamp]))[0]
+            summaries[item_id][world] = summarize_world(df, predicted)
+    return summaries
@@ -0,0 +1,30 @@
+'''
+market_summary
+
+Per-world price summaries and the "Top 3 Servers" buy/sell rankings shared by
+the Dash app and the batch tools.
+'''
+
+# Predictions are made for one day after the frame's newest sale, as in
+# prediction_util.next_day_features
+NEXT_SALE_OFFSET = 86400
+
+
+def newest_sale(prices_df):
+    # Frames come newest first from the API and the store; the row with the
+    # largest timestamp is used rather than relying on either order.
+    return prices_df.iloc[prices_df['Timestamp'].to_numpy().argmax()]
+
+
+def current_price(prices_df):
+    return newest_sale(prices_df)['Price']
+
+
+def best_buy_servers(current_prices, n=3):
+    """Lowest current price first. current_prices: [(server, price), ...]"""
+    return sorted(current_prices, key=lambda x: x[1])[:n]
+
+
+def best_sell_servers(predicted_prices, n=3):
+    """Highest predicted price first. predicted_prices: [(server, price), ...]"""
+    return sorted(predicted_prices, key=lambda x: x[1], reverse=True)[:n]
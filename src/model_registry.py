@@ -0,0 +1,107 @@
+'''
+ModelRegistry
+
+In-memory store of fitted price models keyed by (world, item_id), replacing the
+single shared regression_model.joblib. Least recently used models are evicted
+once max_models is reached. With a persist_dir each key also gets its own
+artifact on disk, and a newer artifact (by mtime) written by another process is
+picked up on the next get(). joblib is only imported once an artifact is
+written or read.
+'''
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import MODEL_CACHE_SIZE, MODEL_DIR
+
+
+class ModelRegistry:
+    def __init__(self, max_models=MODEL_CACHE_SIZE, persist_dir=MODEL_DIR):
+        self.max_models = max(1, int(max_models))
+        self.persist_dir = persist_dir
+        self._models = OrderedDict()  # (world, item_id) -> (model, artifact mtime or None)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(world, item_id):
+        return (str(world), int(item_id))
+
+    def _artifact_path(self, key):
+        world, item_id = key
+        safe_world = re.sub(r"[^A-Za-z0-9_-]", "_", world)
+        return os.path.join(self.persist_dir, f"{safe_world}_{item_id}.joblib")
+
+    def _store(self, key, model, mtime):
+        with self._lock:
+            self._models[key] = (model, mtime)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+
+    def put(self, world, item_id, model):
+        key = self._key(world, item_id)
+        mtime = None
+        if self.persist_dir:
+            import joblib
+
+            os.makedirs(self.persist_dir, exist_ok=True)
+            path = self._artifact_path(key)
+            # Write then rename so readers never load a half-written file
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            joblib.dump(model, tmp_path)
+            os.replace(tmp_path, path)
+            mtime = os.path.getmtime(path)
+        self._store(key, model, mtime)
+
+    def get(self, world, item_id):
+        key = self._key(world, item_id)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+
+        if self.persist_dir:
+            path = self._artifact_path(key)
+            try:
+                disk_mtime = os.path.getmtime(path)
+            except OSError:
+                disk_mtime = None
+            if disk_mtime is not None and (entry is None or entry[1] is None or disk_mtime > entry[1]):
+                import joblib
+
+                model = joblib.load(path)
+                self._store(key, model, disk_mtime)
+                return model
+
+        return entry[0] if entry is not None else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def predict(self, world, item_id, X):
+        model = self.get(world, item_id)
+        if model is None:
+            raise KeyError(f"No model registered for {world} / {item_id}")
+        return model.predict(X)
+
+    def predict_many(self, features_by_key):
+        """Predict for several keys at once.
+
+        features_by_key maps (world, item_id) to a feature DataFrame. Returns
+        {(world, item_id): predictions}; keys without a model are left out.
+        """
+        predictions = {}
+        for (world, item_id), X in features_by_key.items():
+            model = self.get(world, item_id)
+            if model is not None:
+                predictions[(world, item_id)] = model.predict(X)
+        return predictions
+
+
+default_registry = ModelRegistry()
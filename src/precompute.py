@@ -0,0 +1,107 @@
+'''
+precompute
+
+Offline job that runs the lookup pipeline for a watchlist (or the whole item
+catalog) across one or more data centers on a process pool and writes each
+(DC, world, item)'s current, min, max and predicted price into the prediction
+table the Dash app serves from.
+
+Usage:
+    python precompute.py --watchlist watchlist.txt          # every DC
+    python precompute.py --dc Aether Crystal --all-items --workers 8
+
+A watchlist file has one item name or ID per line; blank lines and lines
+starting with # are ignored.
+'''
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import DC_WORLDS, PRECOMPUTE_WORKERS
+from item_index import ItemIndex
+from market_engine import lookup_item
+from prediction_table import default_prediction_table
+from instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+
+def precompute_item(task):
+    dc_name, item_id = task
+    try:
+        results, summaries = lookup_item(DC_WORLDS[dc_name], item_id, dc_name)
+    except Exception as e:
+        logger.error("%s / %s: %s", dc_name, item_id, e)
+        return dc_name, item_id, None
+
+    failed = [world for world, result in results.items() if isinstance(result, Exception)]
+    if failed:
+        # Don't cache an answer with holes in it; the app will compute it live
+        logger.warning("%s / %s: skipped, failed worlds: %s", dc_name, item_id, ", ".join(failed))
+        return dc_name, item_id, None
+    return dc_name, item_id, summaries
+
+
+def run_precompute(dc_names, item_ids, workers=PRECOMPUTE_WORKERS, table=None):
+    """Compute and store every (DC, item) pair. Returns how many were stored."""
+    if table is None:
+        table = default_prediction_table
+
+    tasks = [(dc_name, int(item_id)) for dc_name in dc_names for item_id in item_ids]
+    stored = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as pool:
+        for dc_name, item_id, summaries in pool.map(precompute_item, tasks, chunksize=4):
+            if summaries is not None:
+                table.upsert(dc_name, item_id, DC_WORLDS[dc_name], summaries)
+                stored += 1
+
+    logger.info("Precomputed %d/%d (DC, item) pairs in %.1fs.", stored, len(tasks), time.time() - start)
+    return stored
+
+
+def load_catalog(path=os.path.join(os.path.dirname(__file__), "items.json")):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_watchlist(path, index):
+    item_ids = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            item_id = int(entry) if entry.isdigit() else index.id_for(entry)
+            if item_id is None:
+                logger.warning("Unknown item in watchlist: %s", entry)
+                continue
+            item_ids.append(item_id)
+    return item_ids
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute per-world prices and predictions for the app.")
+    parser.add_argument("--dc", nargs="+", choices=sorted(DC_WORLDS), default=sorted(DC_WORLDS),
+                        help="Data centers to compute (default: all)")
+    items = parser.add_mutually_exclusive_group(required=True)
+    items.add_argument("--watchlist", help="File with one item name or ID per line")
+    items.add_argument("--all-items", action="store_true", help="Every item in items.json")
+    parser.add_argument("--workers", type=int, default=PRECOMPUTE_WORKERS, help="Worker processes")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    catalog = load_catalog()
+    if args.all_items:
+        item_ids = sorted(set(catalog.values()))
+    else:
+        item_ids = read_watchlist(args.watchlist, ItemIndex(catalog))
+
+    run_precompute(args.dc, item_ids, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+'''
+PredictionTable
+
+SQLite table of precomputed per-(DC, world, item) current, min, max and
+predicted prices. Written by precompute.py and by live lookups; the app reads
+it first and only runs the pipeline when there is no fresh entry.
+'''
+import os
+import sqlite3
+import threading
+import time
+
+from config import PREDICTION_DB_PATH, PREDICTION_MAX_AGE_SECONDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    dc              TEXT    NOT NULL,
+    item_id         INTEGER NOT NULL,
+    world           TEXT    NOT NULL,
+    current_price   INTEGER,
+    min_price       INTEGER,
+    max_price       INTEGER,
+    predicted_price REAL,
+    computed_at     REAL    NOT NULL,
+    PRIMARY KEY (dc, item_id, world)
+) WITHOUT ROWID
+"""
+
+SUMMARY_FIELDS = ("current_price", "min_price", "max_price", "predicted_price")
+
+
+class PredictionTable:
+    def __init__(self, path=PREDICTION_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, dc_name, item_id, worlds, summaries, computed_at=None):
+        """Store one item's results. summaries: {world: summarize_world() dict}.
+
+        Worlds without a summary are stored with NULL prices, so a fresh
+        "no sales" answer is cached too.
+        """
+        computed_at = computed_at or time.time()
+        rows = []
+        for world in worlds:
+            summary = summaries.get(world) or {}
+            rows.append((dc_name, int(item_id), world, *(summary.get(field) for field in SUMMARY_FIELDS), computed_at))
+        conn = self._connect()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def lookup(self, dc_name, item_id, worlds, max_age=PREDICTION_MAX_AGE_SECONDS):
+        """{world: summary} if every world has an entry newer than max_age, else None.
+
+        Worlds stored without sales are left out of the result.
+        """
+        rows = self._connect().execute(
+            "SELECT world, current_price, min_price, max_price, predicted_price, computed_at "
+            "FROM predictions WHERE dc = ? AND item_id = ?",
+            (dc_name, int(item_id))
+        ).fetchall()
+
+        oldest_allowed = time.time() - max_age
+        by_world = {row[0]: row for row in rows if row[5] >= oldest_allowed}
+        if any(world not in by_world for world in worlds):
+            return None
+
+        return {
+            world: dict(zip(SUMMARY_FIELDS, by_world[world][1:5]))
+            for world in worlds if by_world[world][1] is not None
+        }
+
+    def lookup_many(self, dc_name, item_ids, worlds, max_age=PREDICTION_MAX_AGE_SECONDS):
+        """lookup() for many items in one query.
+
+        Returns {item_id: (summaries, computed_at)} for the items that are
+        fresh for every world; computed_at is the newest of their rows.
+        """
+        item_ids = sorted({int(item_id) for item_id in item_ids})
+        rows = []
+        conn = self._connect()
+        for start in range(0, len(item_ids), 500):
+            chunk = item_ids[start:start + 500]
+            rows.extend(conn.execute(
+                "SELECT item_id, world, current_price, min_price, max_price, predicted_price, computed_at "
+                f"FROM predictions WHERE dc = ? AND item_id IN ({','.join('?' * len(chunk))})",
+                (dc_name, *chunk)
+            ).fetchall())
+
+        oldest_allowed = time.time() - max_age
+        by_item = {}
+        for row in rows:
+            if row[6] >= oldest_allowed:
+                by_item.setdefault(row[0], {})[row[1]] = row
+
+        results = {}
+        for item_id, by_world in by_item.items():
+            if any(world not in by_world for world in worlds):
+                continue
+            summaries = {
+                world: dict(zip(SUMMARY_FIELDS, by_world[world][2:6]))
+                for world in worlds if by_world[world][2] is not None
+            }
+            results[item_id] = (summaries, max(by_world[world][6] for world in worlds))
+        return results
+
+
+default_prediction_table = PredictionTable()
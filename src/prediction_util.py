@@ -1,34 +1,56 @@
+import logging
 import pandas as pd
-import traceback
-from joblib import load
+from model_registry import default_registry
+from instrumentation import stage_timer
+from market_summary import newest_sale
 
-def predict_next_price_from_model(prices_df):
-    try:
-        model = load("regression_model.joblib")
-        last_row = prices_df.iloc[-1]
-        item_id = last_row['ItemID']
-        server = last_row['Server']
-        last_timestamp = last_row['Timestamp']
+logger = logging.getLogger(__name__)
+
+def next_day_features(prices_df):
+    last_row = newest_sale(prices_df)
+    item_id = last_row['ItemID']
+    server = last_row['Server']
+    last_timestamp = last_row['Timestamp']
 
-        print("\n--- Prediction Debug Info ---")
-        print(f"Last sale timestamp: {last_timestamp} -> {pd.to_datetime(last_timestamp, unit='s')}")
+    next_date = pd.to_datetime(last_timestamp, unit='s') + pd.Timedelta(days=1)
+    next_timestamp = int(next_date.timestamp())
 
-        next_date = pd.to_datetime(last_timestamp, unit='s') + pd.Timedelta(days=1)
-        next_timestamp = int(next_date.timestamp())
+    logger.debug("%s / %s: last sale %s, predicting for %s",
+                 server, item_id, pd.to_datetime(last_timestamp, unit='s'), next_date)
 
-        print(f"Predicted for next day: {next_timestamp} -> {next_date}")
-        print("-----------------------------------\n")
+    return pd.DataFrame([{
+        'ItemID': item_id,
+        'Timestamp': next_timestamp,
+        'Server': server
+    }])
 
-        X_pred = pd.DataFrame([{
-            'ItemID': item_id,
-            'Timestamp': next_timestamp,
-            'Server': server
-        }])
+def predict_next_price_from_model(prices_df, registry=None):
+    if registry is None:
+        registry = default_registry
+    try:
+        X_pred = next_day_features(prices_df)
+        world = X_pred['Server'].iloc[0]
+        item_id = X_pred['ItemID'].iloc[0]
 
-        predicted_price = model.predict(X_pred)[0]
+        predicted_price = registry.predict(world, item_id, X_pred)[0]
         return predicted_price
 
     except Exception as e:
-        print("[Prediction Error]")
-        traceback.print_exc()
-        raise RuntimeError(f"Prediction failed: {e}")
\ No newline at end of file
+        logger.exception("Prediction failed")
+        raise RuntimeError(f"Prediction failed: {e}")
+
+def predict_next_prices(frames, registry=None):
+    # frames: {world: prices_df}. Returns {world: predicted price} for every
+    # world with data and a registered model.
+    if registry is None:
+        registry = default_registry
+    with stage_timer("predict", world=next(iter(frames)) if len(frames) == 1 else None):
+        features = {}
+        for world, prices_df in frames.items():
+            if prices_df is None or prices_df.empty:
+                continue
+            X_pred = next_day_features(prices_df)
+            features[(world, int(X_pred['ItemID'].iloc[0]))] = X_pred
+
+        predictions = registry.predict_many(features)
+    return {world: values[0] for (world, _), values in predictions.items()}
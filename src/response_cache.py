@@ -0,0 +1,136 @@
+'''
+ResponseCache
+
+TTL + LRU cache for Universalis calls with request coalescing: while a key is
+being loaded, other callers asking for the same key wait for that one load
+("singleflight") instead of making their own upstream call. Optionally serves
+a stale value for a grace period while refreshing it in the background, and
+can sit in front of a SharedCache so several worker processes share loads too.
+'''
+import threading
+import time
+from collections import OrderedDict
+
+from config import CACHE_TTL_SECONDS, CACHE_STALE_SECONDS, CACHE_MAX_ENTRIES, SHARED_CACHE_PATH
+from shared_cache import SharedCache
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def _is_cacheable(value):
+    # Fetch helpers return None on failure; those must not be cached
+    return value is not None
+
+
+class ResponseCache:
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, stale_ttl=CACHE_STALE_SECONDS, shared=None):
+        self.ttl = ttl
+        self.max_entries = max(1, int(max_entries))
+        self.stale_ttl = stale_ttl
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._inflight = {}            # key -> _Call
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.shared_hits = 0
+
+    def get_or_load(self, key, loader, cacheable=_is_cacheable):
+        """Return the cached value for key, calling loader() on a miss.
+
+        Values for which cacheable(value) is false are returned but not
+        stored. Callers share the returned object and must not mutate it.
+        """
+        refresh = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = time.monotonic() - stored_at
+                if age <= self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return value
+                if age <= self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key in self._inflight:
+                        return value
+                    refresh = self._inflight[key] = _Call()
+                else:
+                    del self._entries[key]
+
+            if refresh is None:
+                call = self._inflight.get(key)
+                leader = call is None
+                if leader:
+                    self.misses += 1
+                    call = self._inflight[key] = _Call()
+                else:
+                    self.coalesced += 1
+
+        if refresh is not None:
+            threading.Thread(target=self._load, args=(key, refresh, loader, cacheable), daemon=True).start()
+            return value
+
+        if leader:
+            self._load(key, call, loader, cacheable)
+        return call.result()
+
+    def _load(self, key, call, loader, cacheable):
+        age = None
+        try:
+            if self.shared is not None:
+                # Another worker may already have it; the local entry then
+                # only lives for what is left of the shared entry's TTL.
+                call.value, age = self.shared.load(key, loader, self.ttl, cacheable)
+            else:
+                call.value = loader()
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                if age is not None:
+                    self.shared_hits += 1
+                if call.error is None and cacheable(call.value):
+                    self._entries[key] = (call.value, time.monotonic() - (age or 0.0))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            call.done.set()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "stale_hits": self.stale_hits,
+                "shared_hits": self.shared_hits,
+                "size": len(self._entries),
+            }
+
+
+history_cache = ResponseCache(shared=SharedCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None)
@@ -0,0 +1,143 @@
+'''
+scanner
+
+Bulk cross-world arbitrage scan over many items in one data center. History is
+fetched SCAN_BATCH_SIZE items per Universalis request on a bounded thread
+pool, every (world, item) series is fitted in one batch_regression pass, and
+each item gets the same buy/sell picks as the app's "Top 3 Servers" summary:
+buy where the current price is lowest, sell where the predicted price is
+highest. Items are ranked by the spread between the two.
+
+Usage:
+    python scanner.py Aether                       # every item in items.json
+    python scanner.py Crystal --item-ids 5057,5069 --output crystal.csv
+'''
+import argparse
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_regression import fit_series
+from config import DC_WORLDS, SCAN_BATCH_SIZE, SCAN_SALES_LIMIT, SCAN_MAX_WORKERS
+from DataAquisition import fetch_dc_entries_many
+from market_summary import NEXT_SALE_OFFSET, best_buy_servers, best_sell_servers
+from instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+RESULT_COLUMNS = [
+    "ItemID", "ItemName", "BuyWorld", "BuyPrice", "SellWorld", "PredictedSellPrice",
+    "Spread", "SpreadPct", "Worlds"
+]
+
+
+def fetch_dc_sales_many(dc_name, item_ids, sales_limit=SCAN_SALES_LIMIT,
+                        batch_size=SCAN_BATCH_SIZE, max_workers=SCAN_MAX_WORKERS) -> pd.DataFrame:
+    """One stacked sales frame (ItemID, Server, Price, Timestamp) for many items.
+
+    Loaded with fetch_dc_entries_many, so worlds a data-center response
+    didn't fully cover are re-fetched rather than left out of the ranking.
+    Rows keep the API's order within each (world, item) series.
+    """
+    sales = fetch_dc_entries_many(dc_name, DC_WORLDS[dc_name], item_ids, sales_limit, batch_size, max_workers)
+
+    item_column, server_column, prices, timestamps = [], [], [], []
+    for (world, item_id), world_sales in sales.items():
+        item_column.extend([item_id] * len(world_sales))
+        server_column.extend([world] * len(world_sales))
+        prices.extend(sale["pricePerUnit"] for sale in world_sales)
+        timestamps.extend(sale["timestamp"] for sale in world_sales)
+    if not item_column:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "ItemID": np.array(item_column, dtype=np.int32),
+        "Server": server_column,
+        "Price": np.array(prices, dtype=np.int32),
+        "Timestamp": np.array(timestamps, dtype=np.int64),
+    })
+
+
+def scan_arbitrage(dc_name, item_ids, item_names=None, sales_limit=SCAN_SALES_LIMIT,
+                   batch_size=SCAN_BATCH_SIZE, max_workers=SCAN_MAX_WORKERS, output_path=None):
+    """Rank cross-world buy-low/sell-high opportunities for item_ids on dc_name.
+
+    Returns a DataFrame (RESULT_COLUMNS) sorted by Spread, best first, and
+    writes it as CSV to output_path when given. item_names maps ID -> name
+    for display.
+    """
+    if dc_name not in DC_WORLDS:
+        raise ValueError(f"Unknown data center: {dc_name}")
+
+    item_ids = [int(item_id) for item_id in item_ids]
+    sales = fetch_dc_sales_many(dc_name, item_ids, sales_limit, batch_size, max_workers)
+    if sales.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    models = fit_series(sales)
+
+    # Same reference row as current_price() and next_day_features() use on a
+    # per-world frame: the series' newest sale.
+    last_rows = sales.loc[sales.groupby(["Server", "ItemID"], sort=False)["Timestamp"].idxmax()]
+    next_timestamps = last_rows["Timestamp"].to_numpy() + NEXT_SALE_OFFSET
+
+    by_item = {}
+    for world, item_id, price, next_timestamp in zip(last_rows["Server"], last_rows["ItemID"].tolist(),
+                                                     last_rows["Price"].tolist(), next_timestamps):
+        predicted = float(models[(world, item_id)].predict(np.array([next_timestamp]))[0])
+        current_prices, predicted_prices = by_item.setdefault(item_id, ([], []))
+        current_prices.append((world, price))
+        predicted_prices.append((world, predicted))
+
+    rows = []
+    for item_id, (current_prices, predicted_prices) in by_item.items():
+        buy_world, buy_price = best_buy_servers(current_prices, n=1)[0]
+        sell_world, sell_price = best_sell_servers(predicted_prices, n=1)[0]
+        spread = sell_price - buy_price
+        rows.append({
+            "ItemID": item_id,
+            "ItemName": (item_names or {}).get(item_id, ""),
+            "BuyWorld": buy_world,
+            "BuyPrice": buy_price,
+            "SellWorld": sell_world,
+            "PredictedSellPrice": round(sell_price, 2),
+            "Spread": round(spread, 2),
+            "SpreadPct": round(100.0 * spread / buy_price, 2) if buy_price else None,
+            "Worlds": len(current_prices),
+        })
+
+    results = pd.DataFrame(rows, columns=RESULT_COLUMNS).sort_values("Spread", ascending=False, ignore_index=True)
+    if output_path:
+        results.to_csv(output_path, index=False)
+        logger.info("Saved %d ranked items to '%s'.", len(results), output_path)
+    return results
+
+
+def load_catalog(path=os.path.join(os.path.dirname(__file__), "items.json")):
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(item_id): name for name, item_id in json.load(f).items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan a data center for cross-world arbitrage opportunities.")
+    parser.add_argument("dc", choices=sorted(DC_WORLDS), help="Data center to scan")
+    parser.add_argument("--item-ids", help="Comma-separated item IDs (default: every item in items.json)")
+    parser.add_argument("--output", default="arbitrage.csv", help="CSV file for the ranked table")
+    parser.add_argument("--top", type=int, default=20, help="Rows to print")
+    parser.add_argument("--sales-limit", type=int, default=SCAN_SALES_LIMIT, help="Sales per world per item")
+    parser.add_argument("--workers", type=int, default=SCAN_MAX_WORKERS, help="Concurrent requests")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    catalog = load_catalog()
+    item_ids = [int(x) for x in args.item_ids.split(",")] if args.item_ids else sorted(catalog)
+
+    results = scan_arbitrage(args.dc, item_ids, catalog, sales_limit=args.sales_limit,
+                             max_workers=args.workers, output_path=args.output)
+    print(results.head(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
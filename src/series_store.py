@@ -0,0 +1,201 @@
+'''
+series_store
+
+Compact in-memory price series for large watchlists. Each (world, item) is
+a RingSeries: a fixed-capacity ring buffer of (timestamp, price, quantity)
+records, 10 bytes each, in one NumPy array. The buffer is mirrored: with n
+slots allocated, every record is written at slot i and slot i + n. That way
+the newest `size` records are always one contiguous slice, so view(),
+timestamps and prices are zero-copy views, oldest first, even after the ring
+wraps. Appends are O(1). A series starts small and doubles up to its
+capacity, so series with few sales stay small.
+
+SeriesStore holds many series under a memory budget and evicts the least
+recently used ones past it. The app keeps each world card's sales in
+default_series_store, and the overlay chart is drawn from snapshots of them.
+LinearSeriesModel keeps the window of sales it was fitted on in a RingSeries.
+'''
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import SERIES_CAPACITY, SERIES_MEMORY_BUDGET_MB
+
+# Epoch seconds fit uint32 until 2106; Universalis stacks are at most 9999.
+SALE_DTYPE = np.dtype([("timestamp", np.uint32), ("price", np.int32), ("quantity", np.uint16)])
+
+INITIAL_SLOTS = 8
+# Rough per-series cost beyond the buffer itself (object, key, dict slot)
+SERIES_OVERHEAD_BYTES = 400
+
+
+class RingSeries:
+    __slots__ = ("capacity", "_buf", "_slots", "_start", "_size")
+
+    def __init__(self, capacity=SERIES_CAPACITY):
+        self.capacity = max(1, int(capacity))
+        self._slots = min(INITIAL_SLOTS, self.capacity)
+        self._buf = np.zeros(2 * self._slots, dtype=SALE_DTYPE)
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._buf.nbytes
+
+    @property
+    def last_timestamp(self):
+        return int(self._buf["timestamp"][self._start + self._size - 1]) if self._size else None
+
+    def view(self):
+        """Records oldest first, as a read-only view into the buffer."""
+        view = self._buf[self._start:self._start + self._size]
+        view.flags.writeable = False
+        return view
+
+    @property
+    def timestamps(self):
+        return self.view()["timestamp"]
+
+    @property
+    def prices(self):
+        return self.view()["price"]
+
+    @property
+    def quantities(self):
+        return self.view()["quantity"]
+
+    def _grow(self, needed):
+        slots = self._slots
+        while slots < needed and slots < self.capacity:
+            slots = min(self.capacity, slots * 2)
+        if slots == self._slots:
+            return
+        buf = np.zeros(2 * slots, dtype=SALE_DTYPE)
+        buf[:self._size] = self._buf[self._start:self._start + self._size]
+        buf[slots:slots + self._size] = buf[:self._size]
+        self._buf, self._slots, self._start = buf, slots, 0
+
+    def append(self, timestamp, price, quantity=1):
+        """Add one sale (newer than the last one). Evicts the oldest when full."""
+        if self._size == self._slots:
+            self._grow(self._size + 1)
+        slots = self._slots
+        record = (timestamp, price, quantity)
+        if self._size < slots:
+            position = (self._start + self._size) % slots
+            self._size += 1
+        else:
+            position = self._start
+            self._start = (self._start + 1) % slots
+        self._buf[position] = record
+        self._buf[position + slots] = record
+
+    def extend(self, timestamps, prices, quantities=None):
+        """Add sales newer than last_timestamp, in any order. Returns how many
+        were added: only the newest `capacity` of a large batch are kept."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.int64)
+        quantities = np.ones_like(timestamps) if quantities is None else np.asarray(quantities, dtype=np.int64)
+
+        last = self.last_timestamp
+        if last is not None:
+            is_new = timestamps > last
+            timestamps, prices, quantities = timestamps[is_new], prices[is_new], quantities[is_new]
+        count = timestamps.size
+        if count == 0:
+            return 0
+
+        order = np.argsort(timestamps, kind="stable")[-self.capacity:]
+        self._grow(self._size + order.size)
+        slots = self._slots
+        kept = order.size
+
+        first = (self._start + self._size) % slots
+        positions = (first + np.arange(kept)) % slots
+        self._buf["timestamp"][positions] = timestamps[order]
+        self._buf["price"][positions] = prices[order]
+        self._buf["quantity"][positions] = quantities[order]
+        self._buf[positions + slots] = self._buf[positions]
+
+        overflow = max(0, self._size + kept - slots)
+        self._start = (self._start + overflow) % slots
+        self._size = min(slots, self._size + kept)
+        return int(kept)
+
+
+class SeriesStore:
+    """RingSeries per (world, item_id), kept within memory_budget_mb."""
+
+    def __init__(self, capacity=SERIES_CAPACITY, memory_budget_mb=SERIES_MEMORY_BUDGET_MB):
+        self.capacity = capacity
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self._series = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def _key(world, item_id):
+        return (str(world), int(item_id))
+
+    def get(self, world, item_id):
+        """The live series. Its views can change under a concurrent extend();
+        use snapshot() to read it from another thread."""
+        key = self._key(world, item_id)
+        with self._lock:
+            series = self._series.get(key)
+            if series is not None:
+                self._series.move_to_end(key)
+            return series
+
+    def snapshot(self, world, item_id):
+        """Copy of a series' records (SALE_DTYPE, oldest first), or None."""
+        key = self._key(world, item_id)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                return None
+            self._series.move_to_end(key)
+            return series.view().copy()
+
+    def extend(self, world, item_id, timestamps, prices, quantities=None):
+        """Add sales to a series (created on first use). Returns how many were added."""
+        key = self._key(world, item_id)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = RingSeries(self.capacity)
+                self._nbytes += SERIES_OVERHEAD_BYTES + series.nbytes
+            self._series.move_to_end(key)
+
+            before = series.nbytes
+            added = series.extend(timestamps, prices, quantities)
+            self._nbytes += series.nbytes - before
+
+            # Never evict the series just written
+            while self._nbytes > self.memory_budget and len(self._series) > 1:
+                _, evicted = self._series.popitem(last=False)
+                self._nbytes -= SERIES_OVERHEAD_BYTES + evicted.nbytes
+                self.evictions += 1
+            return added
+
+    def __len__(self):
+        with self._lock:
+            return len(self._series)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "bytes": self._nbytes,
+                "budget_bytes": self.memory_budget,
+                "evictions": self.evictions,
+            }
+
+
+default_series_store = SeriesStore()
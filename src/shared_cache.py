@@ -0,0 +1,177 @@
+'''
+SharedCache
+
+SQLite-backed key/value cache shared by every process on the machine. It sits
+behind the in-process ResponseCache when the app runs with several WSGI
+workers. A value loaded by one worker is served to the others until it
+expires. A short lease per key makes the other workers wait for an in-flight
+load instead of each calling Universalis themselves. The same file type also
+holds token buckets (take_token) so rate limits hold across processes.
+'''
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from config import SHARED_CACHE_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key        TEXT PRIMARY KEY,
+    value      BLOB,
+    stored_at  REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS leases (
+    key        TEXT PRIMARY KEY,
+    owner      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS buckets (
+    name       TEXT PRIMARY KEY,
+    tokens     REAL NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+POLL_SECONDS = 0.05
+PURGE_EVERY = 200
+
+
+class SharedCache:
+    def __init__(self, path, lease_seconds=SHARED_CACHE_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connect(self):
+        # Per thread, and never one inherited across a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return repr(key)
+
+    def _owner(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def get(self, key):
+        """(value, age in seconds) for a live entry, else None."""
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT value, stored_at FROM cache WHERE key = ? AND expires_at > ?", (self._key(key), now)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return pickle.loads(row[0]), max(0.0, now - row[1])
+        except Exception:
+            logger.warning("Ignoring unreadable shared cache entry %r", key)
+            return None
+
+    def set(self, key, value, ttl):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+            (self._key(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now + ttl)
+        )
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+    def _acquire(self, key):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT expires_at FROM leases WHERE key = ?", (self._key(key),)
+            ).fetchone()
+            if row is not None and row[0] > now:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                (self._key(key), self._owner(), now + self.lease_seconds)
+            )
+            return True
+        finally:
+            conn.execute("COMMIT")
+
+    def _release(self, key):
+        self._connect().execute(
+            "DELETE FROM leases WHERE key = ? AND owner = ?", (self._key(key), self._owner())
+        )
+
+    def _leased(self, key):
+        row = self._connect().execute(
+            "SELECT 1 FROM leases WHERE key = ? AND expires_at > ?", (self._key(key), time.time())
+        ).fetchone()
+        return row is not None
+
+    def take_token(self, name, rate, capacity):
+        """Take one token from the token bucket `name` shared by every process.
+
+        Returns 0 if a token was taken, else how many seconds until the next
+        one is due.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (name, tokens - 1, now))
+            return 0.0
+        finally:
+            conn.execute("COMMIT")
+
+    def load(self, key, loader, ttl, cacheable):
+        """(value, age) for key: the shared entry, or loader()'s result with
+        age None, which is stored for ttl seconds if cacheable(value).
+
+        While another process holds the lease for key this waits for its
+        value (up to the lease length) and only then falls back to loading.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+
+        if not self._acquire(key):
+            deadline = time.monotonic() + self.lease_seconds
+            while time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+                entry = self.get(key)
+                if entry is not None:
+                    return entry
+                if not self._leased(key):
+                    break
+            # The other load failed or stalled; take over
+            self._acquire(key)
+
+        try:
+            value = loader()
+            if cacheable(value):
+                self.set(key, value, ttl)
+            return value, None
+        finally:
+            self._release(key)
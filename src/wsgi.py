@@ -0,0 +1,32 @@
+'''
+wsgi
+
+Production entry point. It exposes the Flask server behind the Dash app to a
+multi-worker WSGI server, e.g. from the src directory:
+
+    gunicorn --preload --workers 4 --threads 8 --bind 0.0.0.0:8050 wsgi:server
+
+With --preload the item catalog and search index are loaded once in the
+master process and inherited by the forked workers. The workers share these
+files:
+- the SQLite history store
+- the prediction table
+- the cross-process response cache (FFXIV_SHARED_CACHE)
+- the model artifacts (FFXIV_MODEL_DIR)
+
+The last two default here to files next to the history database. A lookup
+served by one worker is therefore not fetched from Universalis or trained
+again by another. Debug mode stays off (see FFXIV_DEBUG for the dev server
+in main.py).
+'''
+import os
+
+# Must be set before config is imported
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("FFXIV_SHARED_CACHE", os.path.join(BASE_DIR, "cache.sqlite3"))
+os.environ.setdefault("FFXIV_MODEL_DIR", os.path.join(BASE_DIR, "models"))
+
+from main import create_app
+
+app = create_app()
+server = app.server